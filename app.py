@@ -1,60 +1,238 @@
-from grid import Grid
-from renderer_basic import BasicRenderer
-from renderer_sprites import SpritesRenderer
+from cli import get_option, get_int_option, get_list_option
+from boards import make_grid, make_renderer, GRID_SETTINGS, RENDERER_SETTINGS, VECTOR_RENDERERS
+from batch import run_batch
+from board_corpus import BoardCorpus, generate_corpus
+from board_hash import BloomFilter
+from board_optimizer import BoardOptimizer, parse_targets
+from grid import check_engine
+from grid_compact import CompactGrid
+from render_cache import RenderCache
+from render_parallel import render_parallel
+from renderer_basic import IMAGE_FORMATS
+from server import serve
+from stats import Stats, NO_STATS
+import playability
+import cProfile
+import json
+import os
+import random
 import sys
 
+
+def generated_grids(count, width, height, grid_settings, base_seed, stats=NO_STATS):
+    """Boards made one at a time, board i from seed base_seed + i."""
+    for index in range(count):
+        grid = make_grid(width, height, grid_settings, seed=base_seed + index)
+        grid.stats = stats
+        grid.generate()
+        yield grid
+
+
+def report_profile(stats, profile_output=None):
+    """Print the time per phase and the counters, also saved as JSON to a .json profile_output."""
+    if not stats:
+        return
+    print("Profile:")
+    print(stats.report())
+    if profile_output and profile_output.endswith(".json"):
+        with open(profile_output, "w") as f:
+            json.dump(stats.to_dict(), f, indent=2)
+        print(f"Profile saved to {profile_output}")
+
+
+def encoding_settings(to_file):
+    """Renderer encoding settings from the options, the format from --format or else the output extension."""
+    settings = {}
+    image_format = get_option("--format")
+    if image_format and image_format.lower() not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown format {image_format}, use one of {', '.join(IMAGE_FORMATS)}")
+    image_format = image_format or IMAGE_FORMATS.get(os.path.splitext(to_file)[1][1:].lower())
+    if image_format:
+        settings["IMAGE_FORMAT"] = IMAGE_FORMATS[image_format.lower()]
+    if get_option("--compress-level"):
+        settings["PNG_COMPRESS_LEVEL"] = get_int_option("--compress-level")
+    if get_option("--colors"):
+        settings["PNG_COLORS"] = get_int_option("--colors")
+    if get_option("--quality"):
+        settings["JPEG_QUALITY"] = settings["WEBP_QUALITY"] = get_int_option("--quality")
+    if "--lossless" in sys.argv:
+        settings["WEBP_LOSSLESS"] = True
+    return settings
+
+
 def main():
     print("Generating grid image with sprites renderer...")
 
     #Params
-    to_file = "grid.png"
-    show_file = False
-    
-    if "--show" in sys.argv:
-        show_file = True
-    
-    if "--output" in sys.argv:
-        output_index = sys.argv.index("--output") + 1
-        if output_index < len(sys.argv):
-            to_file = sys.argv[output_index]
-        else:
-            print("Error: --output flag provided but no filename specified.")
-            exit(1)
+    to_file = get_option("--output", "grid.png")
+    show_file = "--show" in sys.argv
+    seed = get_int_option("--seed")
+    cache_dir = get_option("--cache-dir")
+    width = get_int_option("--width", 6)
+    height = get_int_option("--height", 7)
+    band_rows = get_int_option("--band-rows")
+    jobs = get_int_option("--jobs")
+    try:
+        engine = check_engine(get_option("--engine", "classic"))
+        targets = parse_targets(get_list_option("--target"))
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    grid_settings = {**GRID_SETTINGS, "engine": engine, "REPAIR": "--repair" in sys.argv,
+                     "CHECK_PLAYABLE": "--playable" in sys.argv, "CHUNK_SIZE": get_int_option("--chunk-size", 0), "CHUNK_JOBS": jobs}
+    profile_output = get_option("--profile-output")
+    stats = Stats() if "--profile" in sys.argv or profile_output else NO_STATS
+
+    renderer_type = get_option("--renderer")
+    if renderer_type is None:
+        print("No renderer specified. Using default Renderer by default.")
+        renderer_type = "basic"
+    elif renderer_type == "basic":
+        print("Using Basic Renderer")
+    elif renderer_type == "sprites":
+        print("Using Sprites Renderer")
+    elif renderer_type in VECTOR_RENDERERS:
+        print(f"Using {renderer_type.upper()} vector Renderer")
+        to_file = get_option("--output", f"grid.{renderer_type}")
+    else:
+        print(f"Unknown renderer type: {renderer_type}. Using Sprites Renderer by default.")
+        renderer_type = "sprites"
 
+    try:
+        renderer_settings = {**RENDERER_SETTINGS, **encoding_settings(to_file)} if renderer_type not in VECTOR_RENDERERS else RENDERER_SETTINGS
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    if band_rows and renderer_type not in VECTOR_RENDERERS and not to_file.lower().endswith(".png"):
+        #checked before generating: the bands are only written as PNG
+        print(f"Error: --band-rows only writes PNG, not {to_file}")
+        exit(1)
 
-    if "--renderer" in sys.argv:
-        renderer_index = sys.argv.index("--renderer") + 1
-        if renderer_index < len(sys.argv):
-            renderer_type = sys.argv[renderer_index]
-            if renderer_type == "basic":
-                print("Using Basic Renderer")
-                renderer = BasicRenderer()
-            elif renderer_type == "sprites":
-                print("Using Sprites Renderer")
-                renderer = SpritesRenderer()
-            else:
-                print(f"Unknown renderer type: {renderer_type}. Using Sprites Renderer by default.")
-                renderer = SpritesRenderer()
-        else:
-            print("Error: --renderer flag provided but no renderer type specified.")
+    #board service
+    if "--serve" in sys.argv:
+        serve(
+            host=get_option("--host", "127.0.0.1"),
+            port=get_int_option("--port", 8000),
+            jobs=jobs,
+            verbose="--verbose" in sys.argv,
+            grid_settings=grid_settings,
+            renderer_settings=renderer_settings,
+        )
+        return
+
+    #board corpus: generate into it, query it or take a board from it
+    count = get_int_option("--count")
+    corpus_file = get_option("--corpus")
+    if corpus_file and count is not None:
+        base_seed = seed if seed is not None else random.randrange(2**32)
+        dedup = None
+        if "--dedup" in sys.argv:
+            #sized for the boards already in the corpus too
+            existing = len(BoardCorpus(corpus_file)) if os.path.exists(corpus_file + ".json") else 0
+            dedup = BloomFilter(existing + count)
+        try:
+            writer = generate_corpus(corpus_file, count, width, height, grid_settings, seed=base_seed, jobs=jobs, dedup=dedup)
+        except ValueError as e:
+            print(f"Error: {e}")
             exit(1)
-    else:
-        print("No renderer specified. Using default Renderer by default.")
-        renderer = BasicRenderer()
+        print(f"{count - writer.duplicates} boards added to {corpus_file} (seeds {base_seed} to {base_seed + count - 1}), "
+              f"{writer.duplicates} duplicates left out")
+        return
+    if corpus_file and get_option("--query"):
+        try:
+            numbers = BoardCorpus(corpus_file).query_expression(get_option("--query"))
+        except ValueError as e:
+            print(f"Error: {e}")
+            exit(1)
+        print(f"{len(numbers)} boards match: {' '.join(map(str, numbers[:50]))}{' ...' if len(numbers) > 50 else ''}")
+        return
 
-    #rendering
-    grid = Grid()
-    grid.GEMINESS = 10
-    grid.NEMESISINESS = 1 #classic game style: each monster is nemesis to only one hero class
-    grid.generate()
+    #print sheets: boards_per_page boards per page of one document
+    if count is not None and renderer_type in VECTOR_RENDERERS:
+        base_seed = seed if seed is not None else random.randrange(2**32)
+        renderer = make_renderer(renderer_type)
+        renderer.stats = stats
+        files = renderer.to_sheets(
+            generated_grids(count, width, height, grid_settings, base_seed, stats),
+            get_option("--output", f"sheets.{renderer_type}"),
+            boards_per_page=get_int_option("--per-page", 4),
+        )
+        print(f"{count} boards saved to {', '.join(files)} (seeds {base_seed} to {base_seed + count - 1})")
+        report_profile(stats, profile_output)
+        return
+
+    #batch mode
+    if count is not None:
+        run_batch(
+            count,
+            jobs=jobs,
+            output_dir=get_option("--output-dir", "boards"),
+            width=width,
+            height=height,
+            renderer_type=renderer_type,
+            grid_settings=grid_settings,
+            renderer_settings=renderer_settings,
+            seed=seed,
+            cache_dir=cache_dir,
+            stats=stats,
+            dedup="--dedup" in sys.argv,
+        )
+        report_profile(stats, profile_output)
+        return
 
-    renderer.IMAGE_CELL_SIZE = 120
-    renderer.WALL_WIDTH = 6
+    #rendering
+    if corpus_file:
+        grid = BoardCorpus(corpus_file)[get_int_option("--board", 0)]
+    else:
+        grid = make_grid(width, height, settings=grid_settings, seed=seed, compact="--compact" in sys.argv)
+        if grid.is_chunked() and type(grid) is not CompactGrid:
+            #same board, without turning every chunk into Cell objects
+            grid = make_grid(width, height, settings=grid_settings, seed=grid.seed, compact=True)
+    renderer = make_renderer(renderer_type, renderer_settings)
+    grid.stats = renderer.stats = stats
     #renderer.sprites["bg"] = "assets/backgrounds/altes-papier-pergament-hintergrund-16602085209L8.jpg"
-    renderer.to_image(grid, to_file, show=show_file)
 
-    print(f"Image saved to {to_file}")
+    if corpus_file:
+        #already generated
+        renderer.to_image(grid, to_file)
+    elif cache_dir and renderer_type not in VECTOR_RENDERERS and not targets:
+        #only generates and draws the board if it is not in the cache yet
+        RenderCache(cache_dir).to_image(grid, renderer, to_file)
+    else:
+        grid.generate()
+        print(f"Generated with {grid.regenerations} regenerations and {grid.repaired_cells} repaired cells")
+        if targets:
+            optimizer = BoardOptimizer(grid, targets)
+            met = optimizer.optimize()
+            print(f"Targets {'met' if met else 'not met'} after {optimizer.steps} steps: {optimizer.tally.metrics()}")
+        if "--playable" in sys.argv:
+            #of the board as rendered, after the optimizer
+            report = playability.analyze(grid)
+            print(f"Playability: {report.unreachable_count} unreachable cells, moves to each boss {report.boss_distances}")
+        if renderer_type in VECTOR_RENDERERS:
+            renderer.to_image(grid, to_file)
+        elif band_rows:
+            #huge boards: never the whole image in memory
+            renderer.to_image_tiled(grid, to_file, band_rows=band_rows)
+        elif jobs:
+            #big boards: bands drawn on several cores
+            with stats.phase("render_parallel"):
+                image = render_parallel(grid, renderer, jobs=jobs)
+            renderer.save(image, to_file)
+        else:
+            renderer.to_image(grid, to_file)
+
+    print(f"Image saved to {to_file} (seed {grid.seed})")
+    report_profile(stats, profile_output)
+    if show_file and renderer_type not in VECTOR_RENDERERS:
+        from PIL import Image
+        Image.open(to_file).show()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    profile_output = get_option("--profile-output")
+    if profile_output and not profile_output.endswith(".json"):
+        #whole run under cProfile, read it with python -m pstats <file>
+        cProfile.run("main()", profile_output)
+    else:
+        main()
@@ -0,0 +1,186 @@
+import io
+import itertools
+import multiprocessing
+import os
+import queue
+import random
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from board_hash import fingerprint, FINGERPRINT_SIZE
+from boards import make_grid, make_renderer, GRID_SETTINGS, RENDERER_SETTINGS
+from render_cache import RenderCache
+from sprite_atlas import get_atlas
+from stats import Stats, NO_STATS
+
+# How many rendered images can wait for the encoder inside a worker
+RENDER_QUEUE_SIZE = 2
+# How many encoded boards per worker can wait for the disk writer
+RESULTS_PER_WORKER = 4
+# Boards fingerprinted per task before a batch with dedup
+FINGERPRINT_BLOCK = 1000
+
+
+def board_filename(index, extension="png"):
+    return f"board_{index + 1:04d}.{extension}"
+
+
+def _encode_loop(images: queue.Queue, results, cache, renderer):
+    """Encoder thread of a worker: PNG/WebP/JPEG encoding releases the GIL so it overlaps the next render."""
+    while True:
+        item = images.get()
+        if item is None:
+            break
+        index, image, key = item
+        buffer = io.BytesIO()
+        renderer.encode(image, buffer)
+        data = buffer.getvalue()
+        if cache is not None:
+            cache.store(key, data, renderer.IMAGE_FORMAT)
+        results.put(("board", index, data))
+
+
+def _worker(worker_id, jobs, count, base_seed, width, height, renderer_type, grid_settings, renderer_settings, cache_dir, results, profile, keep):
+    """Render every jobs-th board starting at worker_id and push the encoded images to results.
+
+    With profile, the worker stats come back with its "done" message. With keep (see
+    first_copies), boards that are a later copy of another one are skipped before being made.
+    """
+    try:
+        stats = Stats() if profile else NO_STATS
+        renderer = make_renderer(renderer_type, renderer_settings)
+        renderer.stats = stats
+        if hasattr(renderer, "sprites"):
+            #decode the sprites before the first board, not in the middle of it
+            get_atlas(renderer.sprites)
+        cache = RenderCache(cache_dir) if cache_dir else None
+
+        images = queue.Queue(maxsize=RENDER_QUEUE_SIZE)
+        encoder = threading.Thread(target=_encode_loop, args=(images, results, cache, renderer), daemon=True)
+        encoder.start()
+
+        for index in range(worker_id, count, jobs):
+            grid = make_grid(width, height, grid_settings, seed=base_seed + index)
+            grid.stats = stats
+            if keep is not None and not keep[index]:
+                stats.count("duplicates")
+                continue
+            key = None
+            if cache is not None:
+                key = cache.key(grid, renderer)
+                data = cache.load(key, renderer.IMAGE_FORMAT)
+                if data is not None:
+                    stats.count("cache_hits")
+                    results.put(("board", index, data))
+                    continue
+            if grid.cells is None:
+                grid.generate()
+            images.put((index, renderer.render(grid), key))
+
+        images.put(None)
+        encoder.join()
+        results.put(("done", worker_id, stats.to_dict() if stats else None))
+    except Exception:
+        results.put(("error", worker_id, traceback.format_exc()))
+
+
+def _fingerprints(start, stop, base_seed, width, height, grid_settings):
+    """Fingerprints of boards start to stop of a batch, joined."""
+    fingerprints = []
+    for index in range(start, stop):
+        grid = make_grid(width, height, grid_settings, seed=base_seed + index)
+        grid.generate()
+        fingerprints.append(fingerprint(grid))
+    return b"".join(fingerprints)
+
+
+def first_copies(count, base_seed, width, height, grid_settings=GRID_SETTINGS, jobs=None):
+    """1 for each board of the batch that is the first (lowest index) with its fingerprint, else 0, as bytes.
+
+    The boards are generated over jobs processes to be fingerprinted, not rendered.
+    """
+    starts = range(0, count, FINGERPRINT_BLOCK)
+    stops = [min(count, start + FINGERPRINT_BLOCK) for start in starts]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        blocks = pool.map(_fingerprints, starts, stops, *(itertools.repeat(value) for value in (base_seed, width, height, grid_settings)))
+        fingerprints = np.frombuffer(b"".join(blocks), dtype=np.uint8).reshape(count, FINGERPRINT_SIZE)
+    _, first = np.unique(fingerprints, axis=0, return_index=True)
+    keep = np.zeros(count, dtype=np.uint8)
+    keep[first] = 1
+    return keep.tobytes()
+
+
+def run_batch(count, jobs=None, output_dir="boards", width=6, height=7, renderer_type="basic",
+              grid_settings=GRID_SETTINGS, renderer_settings=RENDERER_SETTINGS, seed=None, cache_dir=None, stats=NO_STATS, dedup=False):
+    """Generate and render count boards over jobs processes, images are written to output_dir.
+
+    The image format and its options come from renderer_settings (IMAGE_FORMAT, PNG_COMPRESS_LEVEL...).
+
+    Board i uses seed + i, so a batch can be reproduced from its seed.
+    The timers and counters of all the workers are added to stats.
+    With dedup, every board is first generated and fingerprinted (see first_copies), then only the
+    first copy (lowest index) of each board, mirror images included, is rendered and written.
+    Fewer than count files can be written, always the same ones for a seed whatever jobs.
+    Returns the list of written files.
+    """
+    jobs = max(1, min(jobs or os.cpu_count() or 1, count))
+    if seed is None:
+        #picked here, forked workers would all inherit the same global random state
+        seed = random.randrange(2**32)
+    print(f"Batch seed: {seed}")
+    extension = renderer_settings.get("IMAGE_FORMAT", "png")
+    os.makedirs(output_dir, exist_ok=True)
+
+    keep = None
+    if dedup:
+        with stats.phase("fingerprints"):
+            keep = first_copies(count, seed, width, height, grid_settings, jobs)
+
+    #bounded so workers wait for the disk instead of piling up encoded boards in memory
+    results = multiprocessing.Queue(maxsize=jobs * RESULTS_PER_WORKER)
+    workers = [
+        multiprocessing.Process(
+            target=_worker,
+            args=(worker_id, jobs, count, seed, width, height, renderer_type, grid_settings, renderer_settings, cache_dir, results, bool(stats), keep),
+            daemon=True,
+        )
+        for worker_id in range(jobs)
+    ]
+
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+
+    written = []
+    running = jobs
+    try:
+        while running > 0:
+            kind, index, payload = results.get()
+            if kind == "board":
+                filename = os.path.join(output_dir, board_filename(index, extension))
+                with stats.phase("write"):
+                    with open(filename, "wb") as f:
+                        f.write(payload)
+                stats.count("bytes_written", len(payload))
+                written.append(filename)
+            elif kind == "done":
+                running -= 1
+                if payload is not None:
+                    stats.merge(payload)
+            else:
+                raise RuntimeError(f"Batch worker {index} failed:\n{payload}")
+    finally:
+        for worker in workers:
+            if worker.is_alive() and running > 0:
+                worker.terminate()
+            worker.join()
+
+    elapsed = time.perf_counter() - start
+    print(f"Rendered {len(written)} boards with {jobs} jobs in {elapsed:.2f}s ({len(written) / elapsed:.1f} boards/sec)")
+    if dedup:
+        print(f"Skipped {count - len(written)} duplicate boards")
+    return sorted(written)
@@ -0,0 +1,117 @@
+# Benchmark generation and rendering across grid sizes:
+#   python benchmark.py [--sizes 6x7,50x50,200x200] [--cell-sizes 24,60,120] [--repeat 3]
+#                       [--output bench.json] [--baseline old_bench.json] [--threshold 0.25]
+# Writes the timings as JSON and, given a baseline, exits with 1 when a case got slower
+# than in the baseline by more than the threshold (0.25 = 25%).
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from cli import get_option, get_int_option, get_float_option, get_list_option
+from boards import make_grid, make_renderer, RENDERERS
+
+DEFAULT_SIZES = "6x7,20x20,50x50,100x100,200x200"
+DEFAULT_CELL_SIZES = "24,60,120"
+# Renders bigger than this many pixels are skipped
+DEFAULT_MAX_PIXELS = 40_000_000
+
+
+def parse_size(size):
+    width, height = size.lower().split("x")
+    return int(width), int(height)
+
+
+def measure(function, repeat):
+    """Best time of repeat runs, peak memory of one more run with tracemalloc on, and the result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    #traced apart, tracemalloc slows everything down
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def generated_grid(width, height, seed):
+    grid = make_grid(width, height, seed=seed)
+    grid.generate()
+    return grid
+
+
+def run(sizes, cell_sizes, repeat=3, max_pixels=DEFAULT_MAX_PIXELS):
+    results = {}
+    for width, height in sizes:
+        name = f"{width}x{height}"
+
+        seconds, peak, grid = measure(lambda: generated_grid(width, height, seed=1), repeat)
+        results[f"generate/{name}"] = {"seconds": seconds, "peak_bytes": peak, "regenerations": grid.regenerations}
+        print(f"generate {name:>9}: {seconds * 1000:9.2f}ms  peak {peak / 2**20:7.1f}MB  {grid.regenerations} regenerations")
+
+        seconds, peak, _ = measure(grid.is_good, repeat)
+        results[f"is_good/{name}"] = {"seconds": seconds, "peak_bytes": peak}
+        print(f"is_good  {name:>9}: {seconds * 1000:9.2f}ms")
+
+        for renderer_type in RENDERERS:
+            for cell_size in cell_sizes:
+                case = f"render/{renderer_type}/{name}/{cell_size}px"
+                if width * height * cell_size * cell_size > max_pixels:
+                    print(f"{case}: skipped, more than {max_pixels} pixels")
+                    continue
+                renderer = make_renderer(renderer_type, {"IMAGE_CELL_SIZE": cell_size})
+                #first render loads sprites and caches the static layers, like a long running batch
+                renderer.render(grid)
+                seconds, peak, _ = measure(lambda: renderer.render(grid), repeat)
+                results[case] = {"seconds": seconds, "peak_bytes": peak}
+                print(f"{case}: {seconds * 1000:9.2f}ms  peak {peak / 2**20:7.1f}MB (Python allocations only)")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Cases slower than the baseline by more than threshold, as (case, old, new)."""
+    regressions = []
+    for case, old in baseline["results"].items():
+        new = results.get(case)
+        if new is not None and new["seconds"] > old["seconds"] * (1 + threshold):
+            regressions.append((case, old["seconds"], new["seconds"]))
+    return regressions
+
+
+def main():
+    sizes = [parse_size(size) for size in get_list_option("--sizes", DEFAULT_SIZES)]
+    cell_sizes = [int(size) for size in get_list_option("--cell-sizes", DEFAULT_CELL_SIZES)]
+    repeat = get_int_option("--repeat", 3)
+    output = get_option("--output", "bench.json")
+    baseline_file = get_option("--baseline")
+    threshold = get_float_option("--threshold", 0.25)
+
+    results = run(sizes, cell_sizes, repeat=repeat, max_pixels=get_int_option("--max-pixels", DEFAULT_MAX_PIXELS))
+    report = {
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if baseline_file:
+        with open(baseline_file) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, threshold)
+        for case, old, new in regressions:
+            print(f"REGRESSION {case}: {old * 1000:.2f}ms -> {new * 1000:.2f}ms (+{(new / old - 1) * 100:.0f}%)")
+        if regressions:
+            exit(1)
+        print(f"No regression above {threshold * 100:.0f}% against {baseline_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+from array import array
+import ast
+import itertools
+import json
+import operator
+import os
+import struct
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from board_hash import fingerprint, FINGERPRINT_SIZE
+from boards import make_grid, GRID_SETTINGS
+from grid import TreasureType, HeroesType, HEROES
+from grid_compact import CompactGrid, TREASURE_CODES, MONSTER_CODES, intern_monster
+
+# corpus.bin: header then one fixed size record per board
+# corpus.bin.json: size, grid settings and the code tables of the treasures and monsters
+# corpus.bin.idx: one fixed size summary per board, for queries
+# corpus.bin.fp: fingerprint of each board (board_hash), to leave out the boards already in
+MAGIC = b"BRDC"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHI")
+HEADER_SIZE = 16
+# Boss cells kept in the index, by boss id
+INDEXED_BOSSES = 3
+# Boards per block written at once when generating
+BLOCK_SIZE = 1000
+# Blocks made ahead per worker when generating: more would keep their records in memory
+BLOCKS_PER_WORKER = 2
+
+INDEX_DTYPE = np.dtype([
+    ("fill_ratio", "<f4"),
+    ("gems", "<u2"),
+    ("treasures", "<u2"),
+    ("monsters", "<u2"),
+    ("traps", "<u2"),
+    ("walls", "<u2"),
+    ("bosses", "u1"),
+    ("adjacent_bosses", "?"),
+    ("boss_cells", "<i4", (INDEXED_BOSSES,)),  # y * width + x of boss 1, 2, 3, -1 when missing
+    ("nemesis", "<u2", (len(HEROES),)),        # monsters having each hero class (HEROES order) as nemesis
+])
+
+
+# What a query (see parse_query) may use besides the index fields, numbers and field[i]
+QUERY_COMPARISONS = {ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+                     ast.Eq: operator.eq, ast.NotEq: operator.ne}
+QUERY_OPERATORS = {ast.BitAnd: operator.and_, ast.BitOr: operator.or_, ast.BitXor: operator.xor,
+                   ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul}
+QUERY_UNARY_OPERATORS = {ast.Invert: operator.invert, ast.Not: np.logical_not, ast.USub: operator.neg}
+QUERY_BOOL_OPERATORS = {ast.And: np.logical_and, ast.Or: np.logical_or}
+
+
+def record_dtype(cells):
+    """One board of cells cells: same arrays as CompactGrid, plus the seed (signed, like Python seeds can be)."""
+    return np.dtype([
+        ("seed", "<i8"),
+        ("walls", "u1", (cells,)),
+        ("flags", "u1", (cells,)),
+        ("traps", "u1", (cells,)),
+        ("bosses", "u1", (cells,)),
+        ("treasures", "<u2", (cells,)),
+        ("monsters", "<u4", (cells,)),
+    ])
+
+
+def treasures_value(code):
+    """Process independent value of a TREASURE_CODES code."""
+    return tuple(treasure_type.value for treasure_type in TREASURE_CODES[code])
+
+
+def monsters_value(code):
+    """Process independent value of a MONSTER_CODES code."""
+    return tuple((monster.name, tuple((hero.value, level) for hero, level in monster.nemesis_classes)) for monster in MONSTER_CODES[code])
+
+
+def encode_boards(grids, fingerprints=False):
+    """Records of the grids with this process codes, the values of the codes used and, if asked, the fingerprints.
+
+    The block can be sent to another process, CorpusWriter.append_block() translates its codes.
+    Fingerprints cost about a tenth of generating a small board, only a writer with dedup needs them.
+    """
+    grids = [grid if isinstance(grid, CompactGrid) else CompactGrid.from_grid(grid) for grid in grids]
+    width, height = grids[0].width, grids[0].height
+    records = np.zeros(len(grids), dtype=record_dtype(width * height))
+    for i, grid in enumerate(grids):
+        if (grid.width, grid.height) != (width, height):
+            raise ValueError(f"Boards of a block must have the same size, {grid.width}x{grid.height} is not {width}x{height}")
+        records["seed"][i] = grid.seed
+        for name in ("walls", "flags", "traps", "bosses", "treasures", "monsters"):
+            records[name][i] = getattr(grid, name)
+    treasures = {code: treasures_value(code) for code in np.unique(records["treasures"]).tolist()}
+    monsters = {code: monsters_value(code) for code in np.unique(records["monsters"]).tolist()}
+    if fingerprints:
+        fingerprints = [fingerprint(grid) for grid in grids]
+    return width, height, records, treasures, monsters, fingerprints or None
+
+
+class CorpusWriter:
+    """Appends boards to a corpus (created if missing), a block of records at a time.
+
+    All the boards of a corpus have the same size. With dedup (FingerprintSet or BloomFilter),
+    boards already in the corpus or appended before, mirror images included, are left out.
+    The .fp file has the fingerprints of the first boards: writers with dedup fill in the
+    missing ones when they open the corpus (older corpora have none) and keep it up to date.
+    """
+
+    def __init__(self, path, width, height, settings: dict = GRID_SETTINGS, dedup=None):
+        self.path = path
+        if os.path.exists(path + ".json"):
+            with open(path + ".json") as f:
+                meta = json.load(f)
+            if (meta["width"], meta["height"]) != (width, height):
+                raise ValueError(f"{path} holds {meta['width']}x{meta['height']} boards, not {width}x{height}")
+            #settings as they read back from the json file
+            if json.loads(json.dumps(dict(settings))) != meta["settings"]:
+                raise ValueError(f"{path} holds boards made with the settings {meta['settings']}, not {dict(settings)}")
+            self.settings = meta["settings"]
+            self.treasures = [tuple(value) for value in meta["treasures"]]
+            self.monsters = [tuple((name, tuple(map(tuple, nemesis))) for name, nemesis in value) for value in meta["monsters"]]
+        else:
+            self.settings = dict(settings)
+            self.treasures = [()]
+            self.monsters = [()]
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, width, height, record_dtype(width * height).itemsize).ljust(HEADER_SIZE, b"\0"))
+            open(path + ".idx", "wb").close()
+            open(path + ".fp", "wb").close()
+        self.width = width
+        self.height = height
+        self.treasure_codes = {value: code for code, value in enumerate(self.treasures)}
+        self.monster_codes = {value: code for code, value in enumerate(self.monsters)}
+        self.dedup = dedup
+        self.duplicates = 0
+        if dedup is not None:
+            if os.path.exists(path + ".json"):
+                self.fill_fingerprints()
+            with open(path + ".fp", "rb") as f:
+                while fingerprint := f.read(FINGERPRINT_SIZE):
+                    dedup.add(fingerprint)
+
+
+    def fill_fingerprints(self):
+        """Fingerprint the boards of the corpus missing from the .fp file, at its end."""
+        corpus = BoardCorpus(self.path)
+        known = os.path.getsize(self.path + ".fp") // FINGERPRINT_SIZE if os.path.exists(self.path + ".fp") else 0
+        known = min(known, len(corpus))
+        with open(self.path + ".fp", "ab") as f:
+            #a cut short write can leave a partial fingerprint, or fingerprints of boards never written
+            f.truncate(known * FINGERPRINT_SIZE)
+            for number in range(known, len(corpus)):
+                f.write(fingerprint(corpus[number]))
+
+
+    def code(self, table, codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = len(table)
+            table.append(value)
+            codes[value] = code
+        return code
+
+
+    def translate(self, column, values, table, codes, dtype):
+        """Codes of a block column turned into codes of the corpus tables."""
+        lookup = np.zeros(max(values) + 1, dtype=dtype)
+        for code, value in values.items():
+            lookup[code] = self.code(table, codes, value)
+        return lookup[column]
+
+
+    def append(self, grids):
+        """Add the grids (generated Grid or CompactGrid) at the end of the corpus."""
+        grids = list(grids)
+        if grids:
+            self.append_block(encode_boards(grids, fingerprints=self.dedup is not None))
+
+
+    def append_block(self, block):
+        """Add a block made by encode_boards(), maybe in another process."""
+        width, height, records, treasures, monsters, fingerprints = block
+        if (width, height) != (self.width, self.height):
+            raise ValueError(f"{self.path} holds {self.width}x{self.height} boards, not {width}x{height}")
+        if self.dedup is not None:
+            if fingerprints is None:
+                raise ValueError("A writer with dedup needs blocks with their fingerprints, see encode_boards()")
+            new = [self.dedup.add(fingerprint) for fingerprint in fingerprints]
+            self.duplicates += new.count(False)
+            records = records[np.array(new, dtype=bool)]
+            fingerprints = [fingerprint for fingerprint, keep in zip(fingerprints, new) if keep]
+            if not len(records):
+                return
+        records["treasures"] = self.translate(records["treasures"], treasures, self.treasures, self.treasure_codes, np.uint16)
+        records["monsters"] = self.translate(records["monsters"], monsters, self.monsters, self.monster_codes, np.uint32)
+
+        #tables first: whatever happens next, every code in the file can be read
+        self.write_meta()
+        with open(self.path, "ab") as f:
+            records.tofile(f)
+        with open(self.path + ".idx", "ab") as f:
+            self.summarize(records).tofile(f)
+        if self.dedup is not None:
+            with open(self.path + ".fp", "ab") as f:
+                f.write(b"".join(fingerprints))
+
+
+    def write_meta(self):
+        meta = {
+            "version": VERSION,
+            "width": self.width,
+            "height": self.height,
+            "settings": self.settings,
+            "treasures": self.treasures,
+            "monsters": self.monsters,
+        }
+        with open(self.path + ".json.tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(self.path + ".json.tmp", self.path + ".json")
+
+
+    def summarize(self, records):
+        """Index entries of the records, computed on the whole block at once."""
+        gem_counts = np.array([value.count(TreasureType.GEMS.value) for value in self.treasures], dtype=np.uint16)
+        treasure_counts = np.array([len(value) for value in self.treasures], dtype=np.uint16)
+        monster_counts = np.array([len(value) for value in self.monsters], dtype=np.uint16)
+        heroes = [hero.value for hero in HEROES]
+        nemesis_counts = np.zeros((len(self.monsters), len(HEROES)), dtype=np.uint16)
+        for code, value in enumerate(self.monsters):
+            for name, nemesis in value:
+                for hero, level in nemesis:
+                    nemesis_counts[code, heroes.index(hero)] += 1
+
+        index = np.zeros(len(records), dtype=INDEX_DTYPE)
+        filled = (records["traps"] > 0) | (records["treasures"] > 0) | (records["monsters"] > 0) | (records["bosses"] > 0)
+        index["fill_ratio"] = filled.mean(axis=1)
+        index["gems"] = gem_counts[records["treasures"]].sum(axis=1)
+        index["treasures"] = treasure_counts[records["treasures"]].sum(axis=1)
+        index["monsters"] = monster_counts[records["monsters"]].sum(axis=1)
+        index["traps"] = records["traps"].sum(axis=1)
+        index["walls"] = np.unpackbits(records["walls"][..., np.newaxis], axis=-1).sum(axis=(1, 2))
+        index["nemesis"] = nemesis_counts[records["monsters"]].sum(axis=1)
+
+        bosses = records["bosses"].reshape(len(records), self.height, self.width)
+        has_boss = bosses > 0
+        index["bosses"] = has_boss.sum(axis=(1, 2))
+        index["adjacent_bosses"] = (has_boss[:, :, 1:] & has_boss[:, :, :-1]).any(axis=(1, 2)) | (has_boss[:, 1:, :] & has_boss[:, :-1, :]).any(axis=(1, 2))
+        for boss in range(INDEXED_BOSSES):
+            at = records["bosses"] == boss + 1
+            index["boss_cells"][:, boss] = np.where(at.any(axis=1), at.argmax(axis=1), -1)
+        return index
+
+
+class BoardCorpus:
+    """Reads a corpus through memory maps: board N is decoded alone, queries only read the index."""
+
+    def __init__(self, path):
+        with open(path + ".json") as f:
+            meta = json.load(f)
+        with open(path, "rb") as f:
+            magic, version, width, height, record_size = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} board corpus")
+        self.path = path
+        self.width = width
+        self.height = height
+        self.settings = meta["settings"]
+        self.dtype = record_dtype(width * height)
+        if self.dtype.itemsize != record_size:
+            raise ValueError(f"{path} records are {record_size} bytes, expected {self.dtype.itemsize}")
+
+        #a write cut short leaves a partial record or missing index entries: ignore them
+        count = min((os.path.getsize(path) - HEADER_SIZE) // record_size, os.path.getsize(path + ".idx") // INDEX_DTYPE.itemsize)
+        if count > 0:
+            self.records = np.memmap(path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+            self.index = np.memmap(path + ".idx", dtype=INDEX_DTYPE, mode="r", shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=self.dtype)
+            self.index = np.zeros(0, dtype=INDEX_DTYPE)
+
+        #corpus codes to this process codes
+        self.treasure_codes = np.array([TREASURE_CODES.code(tuple(TreasureType(value) for value in values)) for values in meta["treasures"]], dtype=np.uint16)
+        self.monster_codes = np.array([
+            MONSTER_CODES.code(tuple(intern_monster(name, [(HeroesType(hero), level) for hero, level in nemesis]) for name, nemesis in values))
+            for values in meta["monsters"]
+        ], dtype=np.uint32)
+
+
+    def __len__(self):
+        return len(self.records)
+
+
+    def __getitem__(self, number) -> CompactGrid:
+        """Board number as a generated CompactGrid, read from the file alone."""
+        record = self.records[number]
+        grid = CompactGrid(self.width, self.height, seed=int(record["seed"]))
+        for name, value in self.settings.items():
+            setattr(grid, name, value)
+        for name in ("walls", "flags", "traps", "bosses"):
+            setattr(grid, name, array('B', record[name].tobytes()))
+        grid.treasures = array('H', self.treasure_codes[record["treasures"]].tobytes())
+        grid.monsters = array('I', self.monster_codes[record["monsters"]].tobytes())
+        return grid
+
+
+    def query(self, condition):
+        """Numbers of the boards whose index entries match condition.
+
+        condition takes the index (numpy structured array, fields of INDEX_DTYPE) and returns a
+        boolean array, like lambda index: (index["gems"] >= 8) & ~index["adjacent_bosses"]
+        """
+        return np.flatnonzero(condition(self.index))
+
+
+    def query_expression(self, expression):
+        """query() from a text expression on the index fields: "(gems >= 8) & ~adjacent_bosses", see parse_query()."""
+        condition = parse_query(expression)
+        return self.query(lambda index: np.broadcast_to(condition(index), index.shape))
+
+
+def parse_query(expression):
+    """Condition for BoardCorpus.query() from a text expression, ValueError when it is not one.
+
+    The expression is read, never run: only index field names, numbers, field[i] for the
+    array fields, comparisons, + - * and & | ^ ~ (or and, or, not) are allowed.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Cannot read the query {expression!r}: {e.msg}")
+    return _query_node(tree.body)
+
+
+def _query_node(node):
+    """Function of the index computing node, for the nodes a query may have."""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float, bool):
+        value = node.value
+        return lambda index: value
+    if isinstance(node, ast.Name) and node.id in INDEX_DTYPE.names:
+        name = node.id
+        return lambda index: index[name]
+    if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id in INDEX_DTYPE.names:
+        name = node.value.id
+        shape = INDEX_DTYPE[name].shape
+        if shape and isinstance(node.slice, ast.Constant) and type(node.slice.value) is int and 0 <= node.slice.value < shape[0]:
+            item = node.slice.value
+            return lambda index: index[name][:, item]
+    if isinstance(node, ast.UnaryOp) and type(node.op) in QUERY_UNARY_OPERATORS:
+        function, operand = QUERY_UNARY_OPERATORS[type(node.op)], _query_node(node.operand)
+        return lambda index: function(operand(index))
+    if isinstance(node, ast.BinOp) and type(node.op) in QUERY_OPERATORS:
+        function, left, right = QUERY_OPERATORS[type(node.op)], _query_node(node.left), _query_node(node.right)
+        return lambda index: function(left(index), right(index))
+    if isinstance(node, ast.BoolOp) and type(node.op) in QUERY_BOOL_OPERATORS:
+        function, operands = QUERY_BOOL_OPERATORS[type(node.op)], [_query_node(value) for value in node.values]
+        return lambda index: function.reduce([operand(index) for operand in operands])
+    if isinstance(node, ast.Compare) and all(type(op) in QUERY_COMPARISONS for op in node.ops):
+        functions = [QUERY_COMPARISONS[type(op)] for op in node.ops]
+        operands = [_query_node(value) for value in [node.left] + node.comparators]
+
+        def compare(index):
+            #a < b < c is a < b and b < c, element by element
+            values = [operand(index) for operand in operands]
+            result = functions[0](values[0], values[1])
+            for function, left, right in zip(functions[1:], values[1:], values[2:]):
+                result = result & function(left, right)
+            return result
+        return compare
+    raise ValueError(f"Not allowed in a query: {ast.unparse(node)}, use the fields {', '.join(INDEX_DTYPE.names)}")
+
+
+def _make_block(start, stop, base_seed, width, height, grid_settings, fingerprints):
+    grids = []
+    for index in range(start, stop):
+        grid = make_grid(width, height, grid_settings, seed=base_seed + index, compact=True)
+        grid.generate()
+        grids.append(grid)
+    return encode_boards(grids, fingerprints)
+
+
+def generate_corpus(path, count, width=6, height=7, grid_settings=GRID_SETTINGS, seed=0, jobs=None, dedup=None):
+    """Generate count boards (board i from seed + i) over jobs processes and append them to the corpus.
+
+    Returns the CorpusWriter, its duplicates tells how many boards dedup left out.
+    """
+    if not (-2**63 <= seed and seed + count <= 2**63):
+        raise ValueError(f"Seeds {seed} to {seed + count - 1} do not fit in the 64 bit seeds of a corpus")
+    blocks = ((start, min(count, start + BLOCK_SIZE)) for start in range(0, count, BLOCK_SIZE))
+    writer = CorpusWriter(path, width, height, grid_settings, dedup)
+    in_flight = (jobs or os.cpu_count()) * BLOCKS_PER_WORKER
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque()
+        while True:
+            for start, stop in itertools.islice(blocks, in_flight - len(pending)):
+                pending.append(pool.submit(_make_block, start, stop, seed, width, height, grid_settings, dedup is not None))
+            if not pending:
+                break
+            #in order, so the boards keep the order of their seeds; the block is dropped once written
+            writer.append_block(pending.popleft().result())
+    return writer
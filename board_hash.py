@@ -0,0 +1,135 @@
+import hashlib
+import math
+
+import numpy as np
+
+from grid import Grid
+from grid_compact import CompactGrid, TREASURE_CODES, MONSTER_CODES
+
+# Fingerprint length in bytes
+FINGERPRINT_SIZE = 16
+# Share of new boards a Bloom filter takes for already seen ones
+BLOOM_ERROR_RATE = 1e-6
+
+# 64 bit hash of each treasure / monster code of this process, from its value
+_treasure_hashes = {}
+_monster_hashes = {}
+
+
+def _value_hash(value) -> int:
+    return int.from_bytes(hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), "little")
+
+
+def _treasures_hash(code):
+    value = _treasure_hashes.get(code)
+    if value is None:
+        #order of the treasures in a cell does not matter
+        value = _value_hash(sorted(treasure_type.value for treasure_type in TREASURE_CODES[code]))
+        _treasure_hashes[code] = value
+    return value
+
+
+def _monsters_hash(code):
+    value = _monster_hashes.get(code)
+    if value is None:
+        value = _value_hash(sorted((monster.name, sorted((hero.value, level) for hero, level in monster.nemesis_classes))
+                                   for monster in MONSTER_CODES[code]))
+        _monster_hashes[code] = value
+    return value
+
+
+def _hashes(codes, code_hash):
+    unique, inverse = np.unique(np.asarray(codes), return_inverse=True)
+    return np.array([code_hash(code) for code in unique.tolist()], dtype=np.uint64)[inverse]
+
+
+def fingerprint(grid: Grid) -> bytes:
+    """Digest of a generated board, the same for the board and its mirror image (left <-> right).
+
+    Made from the resolved edges (walls, warps, starts: a wall belongs to both its cells) and the
+    cell contents (traps, treasures and monsters by value, bosses, flags), so it does not depend on
+    the process or on Grid vs CompactGrid. The board and its mirror are both written out and the
+    smaller one is hashed.
+    """
+    if not isinstance(grid, CompactGrid):
+        grid = CompactGrid.from_grid(grid)
+    width, height = grid.width, grid.height
+    edges = grid.edge_index()
+    horizontal = np.frombuffer(b"".join(edges.horizontal), dtype=np.uint8).reshape(height + 1, width)
+    vertical = np.frombuffer(b"".join(edges.vertical), dtype=np.uint8).reshape(height, width + 1)
+    cells = [
+        np.frombuffer(grid.traps, dtype=np.uint8).reshape(height, width),
+        np.frombuffer(grid.bosses, dtype=np.uint8).reshape(height, width),
+        np.frombuffer(grid.flags, dtype=np.uint8).reshape(height, width),
+        _hashes(grid.treasures, _treasures_hash).reshape(height, width),
+        _hashes(grid.monsters, _monsters_hash).reshape(height, width),
+    ]
+
+    def written(mirror):
+        step = -1 if mirror else 1
+        return b"".join(array[:, ::step].tobytes() for array in [horizontal, vertical] + cells)
+
+    size = f"{width}x{height}:".encode()
+    board = min(written(False), written(True))
+    return hashlib.blake2b(size + board, digest_size=FINGERPRINT_SIZE).digest()
+
+
+class FingerprintSet:
+    """Exact set of fingerprints, about 100 bytes per board."""
+
+    def __init__(self):
+        self.fingerprints = set()
+
+
+    def add(self, fingerprint: bytes) -> bool:
+        """Remember fingerprint, True if it was not seen before."""
+        if fingerprint in self.fingerprints:
+            return False
+        self.fingerprints.add(fingerprint)
+        return True
+
+
+    def __contains__(self, fingerprint):
+        return fingerprint in self.fingerprints
+
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+
+class BloomFilter:
+    """Fingerprints seen, in a fixed number of bits: about 29 bits per board at a 1e-6 error rate.
+
+    Never forgets a fingerprint, but takes a new one for a seen one with probability error_rate
+    (when no more than capacity were added).
+    """
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+
+    def positions(self, fingerprint: bytes):
+        #double hashing on the two halves of the fingerprint, already uniform
+        first = int.from_bytes(fingerprint[:8], "little")
+        second = int.from_bytes(fingerprint[8:16], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+
+    def add(self, fingerprint: bytes) -> bool:
+        """Remember fingerprint, True if it was (most likely) not seen before."""
+        bits = self.bits
+        new = False
+        for position in self.positions(fingerprint):
+            byte, bit = divmod(position, 8)
+            if not bits[byte] & (1 << bit):
+                bits[byte] |= 1 << bit
+                new = True
+        return new
+
+
+    def __contains__(self, fingerprint):
+        bits = self.bits
+        return all(bits[position // 8] & (1 << (position % 8)) for position in self.positions(fingerprint))
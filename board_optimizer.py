@@ -0,0 +1,292 @@
+import random
+from collections import Counter
+
+from grid import Grid, Cell, TreasureType, HEROES, EDGE_WALL
+import playability
+
+# Steps tried before giving up on the targets
+MAX_STEPS = 20_000
+# Odds of each mutation: re-roll the contents of a cell, move a boss, flip a wall
+MUTATIONS = {"reroll": 8, "move_boss": 1, "flip_wall": 2}
+# Metrics a target can be set on, see BoardTally.metrics()
+NEMESIS_METRICS = {f"nemesis_{hero.value}": hero for hero in HEROES}
+METRICS = ["fill_ratio", "gems", "treasures", "monsters", "traps", "walls", "nemesis_types"] + list(NEMESIS_METRICS)
+
+
+class BoardTally:
+    """Counts of a board kept up to date cell by cell: remove() a cell, change it, add() it back.
+
+    walls counts the walled edges inside the board (the fence is not counted), changed with
+    wall_changed(). nemesis_<hero> is the number of monster kinds (names) having that hero
+    class as nemesis, nemesis_types the smallest of them.
+    """
+
+    def __init__(self, grid: Grid):
+        self.cells = grid.width * grid.height
+        self.good_fill_ratio = grid.GOOD_FILL_RATIO
+        self.filled = 0
+        self.gems = 0
+        self.treasures = 0
+        self.monsters = 0
+        self.traps = 0
+        # hero class: Counter of monster names having it as nemesis
+        self.nemesis = {hero: Counter() for hero in HEROES}
+        self.nemesis_kinds = dict.fromkeys(HEROES, 0)
+        for y in range(grid.height):
+            for x in range(grid.width):
+                self.add(grid.get_cell(x, y))
+
+        edges = grid.edge_index()
+        self.walls = sum(1 for row in edges.horizontal[1:-1] for edge in row if edge & EDGE_WALL)
+        self.walls += sum(1 for row in edges.vertical for edge in row[1:-1] if edge & EDGE_WALL)
+
+
+    def add(self, cell, sign=1):
+        if not cell.is_empty():
+            self.filled += sign
+        for treasure in cell.treasures:
+            if treasure.treasure_type == TreasureType.GEMS:
+                self.gems += sign
+            else:
+                self.treasures += sign
+        self.traps += sign * len(cell.traps)
+        monsters = cell.monsters
+        self.monsters += sign * len(monsters)
+        for monster in monsters:
+            for hero, level in monster.nemesis_classes:
+                names = self.nemesis[hero]
+                before = names[monster.name]
+                names[monster.name] = before + sign
+                if before == 0:
+                    self.nemesis_kinds[hero] += 1
+                elif before + sign == 0:
+                    self.nemesis_kinds[hero] -= 1
+
+
+    def remove(self, cell):
+        self.add(cell, -1)
+
+
+    def wall_changed(self, added):
+        self.walls += 1 if added else -1
+
+
+    def fill_ratio(self):
+        return self.filled / self.cells
+
+
+    def is_good(self):
+        """Same as Grid.is_good(), without looking at the cells."""
+        return self.fill_ratio() >= self.good_fill_ratio
+
+
+    def metric(self, name):
+        if name == "fill_ratio":
+            return self.fill_ratio()
+        if name == "nemesis_types":
+            return min(self.nemesis_kinds.values())
+        if name in NEMESIS_METRICS:
+            return self.nemesis_kinds[NEMESIS_METRICS[name]]
+        return getattr(self, name)
+
+
+    def metrics(self):
+        return {name: self.metric(name) for name in METRICS}
+
+
+def parse_targets(specs):
+    """{metric: (low, high)} from items like "gems=6", "fill_ratio=0.4:0.5" or "nemesis_types=2:" (no upper bound)."""
+    targets = {}
+    for spec in specs:
+        name, equals, value = spec.partition("=")
+        name = name.strip()
+        if name not in METRICS:
+            raise ValueError(f"Unknown metric {name}, choose from {', '.join(METRICS)}")
+        if not equals or not value.strip(":"):
+            raise ValueError(f"No value for {name}, write {name}=6, {name}=4:8 or {name}=4:")
+        low, _, high = value.partition(":") if ":" in value else (value, None, value)
+        targets[name] = (float(low) if low else None, float(high) if high else None)
+    return targets
+
+
+class BoardOptimizer:
+    """Local search from a generated board to one meeting targets ({metric: (low, high)}, None is unbounded).
+
+    Each step mutates one cell or edge (re-roll the contents of a cell with the grid odds, move a
+    boss to another cell, flip an inside wall), updates the tally of that cell only and keeps
+    the change if the board got no further from the targets and stays good, else undoes it. A
+    step costs the same whatever the board size. The grid is changed in place through its cells,
+    so a grid tracking its changes gets them marked dirty.
+
+    With grid.CHECK_PLAYABLE, a step must also keep every boss and gem reachable: contents are
+    checked against the cells reachable so far, a flipped wall reaches again from the starts.
+    """
+
+    def __init__(self, grid: Grid, targets: dict, seed=None):
+        self.grid = grid
+        self.targets = targets
+        self.rng = random.Random(seed if seed is not None else grid.seed)
+        self.gen_params = grid.gen_params()
+        self.tally = BoardTally(grid)
+        self.bosses = [(x, y) for y in range(grid.height) for x in range(grid.width) if grid.get_cell(x, y).boss_id]
+        #walls only change when they are a target, else the layout is kept
+        self.mutations = [name for name in MUTATIONS if name != "flip_wall" or "walls" in targets]
+        self.weights = [MUTATIONS[name] for name in self.mutations]
+        self.steps = 0
+        # Cells the heroes reach (PlayabilityReport.reachable), None when playability is not checked
+        self.reachable = playability.analyze(grid).reachable if grid.CHECK_PLAYABLE else None
+        # (x, y) of the cell whose contents the last step changed, None when it flipped a wall
+        self.touched = None
+
+
+    def distance(self):
+        """How far the board is from the targets, 0 when all are met. fill_ratio counts in cells."""
+        total = 0.0
+        for name, (low, high) in self.targets.items():
+            value = self.tally.metric(name)
+            scale = self.tally.cells if name == "fill_ratio" else 1
+            if low is not None and value < low:
+                total += (low - value) * scale
+            elif high is not None and value > high:
+                total += (value - high) * scale
+        return total
+
+
+    def optimize(self, max_steps=MAX_STEPS) -> bool:
+        """Mutate the board until the targets are met (True) or max_steps were tried (False)."""
+        stats = self.grid.stats
+        with stats.phase("optimize"):
+            distance = self.distance()
+            good = self.tally.is_good()
+            for _ in range(max_steps):
+                if distance == 0 and good:
+                    break
+                self.steps += 1
+                undo = getattr(self, self.rng.choices(self.mutations, self.weights)[0])()
+                if undo is None:
+                    continue
+                new_distance = self.distance()
+                new_good = self.tally.is_good()
+                #sideways moves are kept: they let the search walk across plateaus
+                if new_distance <= distance and (new_good or not good) and self.stays_playable():
+                    distance, good = new_distance, new_good
+                else:
+                    undo()
+            stats.count("optimizer_steps", self.steps)
+        if self.reachable is not None and not playability.analyze(self.grid).is_playable():
+            #the board was not playable to start with
+            return False
+        return distance == 0 and good
+
+
+    def stays_playable(self):
+        """True if the last step kept the bosses and gems reachable, or playability is not checked."""
+        if self.reachable is None:
+            return True
+        if self.touched is None:
+            report = playability.analyze(self.grid)
+            if not report.is_playable():
+                return False
+            self.reachable = report.reachable
+            return True
+        #same walls, same reachable cells: only the changed cell can hold something out of reach
+        x, y = self.touched
+        if self.reachable >> (y * self.grid.width + x) & 1:
+            return True
+        cell = self.grid.get_cell(x, y)
+        return not cell.boss_id and not any(treasure.treasure_type == TreasureType.GEMS for treasure in cell.treasures)
+
+
+    def random_cell(self):
+        x = self.rng.randrange(self.grid.width)
+        y = self.rng.randrange(self.grid.height)
+        return x, y, self.grid.get_cell(x, y)
+
+
+    def contents(self, cell):
+        #copies: clear_contents() empties the lists of a Cell in place
+        return list(cell.traps), list(cell.treasures), list(cell.monsters)
+
+
+    def set_contents(self, cell, contents):
+        cell.traps, cell.treasures, cell.monsters = (list(values) for values in contents)
+
+
+    def reroll(self):
+        """New contents for a cell without boss, rolled with the grid odds, walls kept."""
+        x, y, cell = self.random_cell()
+        if cell.boss_id:
+            return None
+        before = self.contents(cell)
+        rolled = Cell()
+        rolled.randomize(self.gen_params, rng=self.rng)
+        self.tally.remove(cell)
+        self.set_contents(cell, self.contents(rolled))
+        self.tally.add(cell)
+        self.touched = (x, y)
+
+        def undo():
+            self.tally.remove(cell)
+            self.set_contents(cell, before)
+            self.tally.add(cell)
+        return undo
+
+
+    def move_boss(self):
+        """A boss to another cell, whose contents go (a boss cell has nothing else)."""
+        index = self.rng.randrange(len(self.bosses)) if self.bosses else None
+        x, y, target = self.random_cell()
+        if index is None or target.boss_id:
+            return None
+        source_position = self.bosses[index]
+        source = self.grid.get_cell(*source_position)
+        boss_id = source.boss_id
+        before = self.contents(target)
+        self.tally.remove(source)
+        self.tally.remove(target)
+        source.boss_id = 0
+        target.clear_contents()
+        target.boss_id = boss_id
+        self.tally.add(source)
+        self.tally.add(target)
+        self.bosses[index] = (x, y)
+        self.touched = (x, y)
+
+        def undo():
+            self.tally.remove(source)
+            self.tally.remove(target)
+            target.boss_id = 0
+            self.set_contents(target, before)
+            source.boss_id = boss_id
+            self.tally.add(source)
+            self.tally.add(target)
+            self.bosses[index] = source_position
+        return undo
+
+
+    def flip_wall(self):
+        """Open a walled inside edge or wall an open one, the east or south edge of a cell."""
+        x, y, cell = self.random_cell()
+        direction, opposite, nx, ny = ('E', 'W', x + 1, y) if self.rng.random() < 0.5 else ('S', 'N', x, y + 1)
+        if nx >= self.grid.width or ny >= self.grid.height:
+            return None
+        neighbor = self.grid.get_cell(nx, ny)
+        before = (cell.walls[direction], neighbor.walls[opposite])
+        walled = before[0] or before[1]
+        if walled:
+            cell.remove_wall(direction)
+            neighbor.remove_wall(opposite)
+        else:
+            cell.add_wall(direction)
+        self.tally.wall_changed(not walled)
+        self.touched = None
+
+        def undo():
+            for target, side, wall in ((cell, direction, before[0]), (neighbor, opposite, before[1])):
+                if wall:
+                    target.add_wall(side)
+                else:
+                    target.remove_wall(side)
+            self.tally.wall_changed(walled)
+        return undo
+
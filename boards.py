@@ -0,0 +1,46 @@
+from grid import Grid
+from grid_compact import CompactGrid
+from renderer_basic import BasicRenderer
+from renderer_sprites import SpritesRenderer
+from renderer_vector import SVGRenderer, PDFRenderer
+
+RENDERERS = {
+    "basic": BasicRenderer,
+    "sprites": SpritesRenderer,
+}
+# Renderers writing documents (bytes) instead of images
+VECTOR_RENDERERS = {
+    "svg": SVGRenderer,
+    "pdf": PDFRenderer,
+}
+
+# Default board settings used by app.py, single board or batch
+GRID_SETTINGS = {
+    "GEMINESS": 10,
+    "NEMESISINESS": 1,  #classic game style: each monster is nemesis to only one hero class
+}
+RENDERER_SETTINGS = {
+    "IMAGE_CELL_SIZE": 120,
+    "WALL_WIDTH": 6,
+}
+
+
+def apply_settings(target, settings: dict):
+    """Set each setting (GEMINESS, IMAGE_CELL_SIZE, engine...) on the target."""
+    for name, value in settings.items():
+        setattr(target, name, value)
+    return target
+
+
+def make_grid(width=6, height=7, settings: dict = GRID_SETTINGS, seed=None, compact=False) -> Grid:
+    """New, not yet generated, Grid (CompactGrid if compact) with the given settings."""
+    grid_class = CompactGrid if compact else Grid
+    return apply_settings(grid_class(width, height, seed=seed), settings)
+
+
+def make_renderer(renderer_type="basic", settings: dict = RENDERER_SETTINGS):
+    """New renderer by name (see RENDERERS and VECTOR_RENDERERS) with the given settings."""
+    renderer_class = RENDERERS.get(renderer_type) or VECTOR_RENDERERS.get(renderer_type)
+    if renderer_class is None:
+        raise ValueError(f"Unknown renderer type: {renderer_type}")
+    return apply_settings(renderer_class(), settings)
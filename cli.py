@@ -0,0 +1,36 @@
+import sys
+
+
+def get_option(flag, default=None):
+    """Value following flag on the command line, default if the flag is absent."""
+    if flag not in sys.argv:
+        return default
+    index = sys.argv.index(flag) + 1
+    if index >= len(sys.argv):
+        print(f"Error: {flag} flag provided but no value specified.")
+        exit(1)
+    return sys.argv[index]
+
+
+def get_int_option(flag, default=None):
+    value = get_option(flag, default)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        print(f"Error: {flag} expects a number, got {value}.")
+        exit(1)
+
+
+def get_float_option(flag, default=None):
+    value = get_option(flag, default)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        print(f"Error: {flag} expects a number, got {value}.")
+        exit(1)
+
+
+def get_list_option(flag, default=""):
+    """Comma separated values following flag."""
+    value = get_option(flag, default)
+    return [item.strip() for item in value.split(",") if item.strip()]
@@ -1,6 +1,10 @@
+import contextlib
 from enum import Enum
+import math
 import random
 
+from stats import NO_STATS
+
 
 class TreasureType(Enum):
     GEMS = "gems"
@@ -14,19 +18,25 @@ class HeroesType(Enum):
     ROGUE = "rogue"
     CLERIC = "cleric"
 
+MONSTER_NAMES = ["Goblin", "Troll", "Dragon", "Skeleton"]
+HEROES = list(HeroesType)
+#cannot have gems without a monster, so the "maybe treasure" is never a gem
+NO_GEM_TREASURES = [treasure_type for treasure_type in TreasureType if treasure_type != TreasureType.GEMS]
+# Ways of rolling the cells of a grid, see Grid.__init__
+ENGINES = ["classic", "vectorized"]
+
 class Monster:
     def __init__(self, name, nemesis_classes=[]):
         self.name = name
         self.nemesis_classes = nemesis_classes
 
     @classmethod
-    def random_monster(cls, nemesisiness=2):
-        monster_names = ["Goblin", "Troll", "Dragon", "Skeleton"]
-        name = random.choice(monster_names)
-        heroes_classes = random.sample(list(HeroesType), k=random.randint(1, nemesisiness))
+    def random_monster(cls, nemesisiness=2, rng=random):
+        name = rng.choice(MONSTER_NAMES)
+        heroes_classes = rng.sample(HEROES, k=rng.randint(1, nemesisiness))
         nemesis_classes = []
         for hero_class in heroes_classes:
-            nemesis_classes.append((hero_class, random.randint(1, 6)))
+            nemesis_classes.append((hero_class, rng.randint(1, 6)))
         return cls(name, nemesis_classes)
     
     def __repr__(self):
@@ -57,49 +67,164 @@ class Cell:
         if direction in self.walls:
             self.walls[direction] = True
 
-    def randomize(self, gen_params:dict):
+    def randomize(self, gen_params:dict, rng=random):
         # Set a random wall based on WALLINESS factor
-        if random.randint(1, 100) <= gen_params["walliness"]:
-            self.walls[random.choice(['N', 'S', 'E', 'W'])] = True
-        if random.randint(1, 100) <= gen_params["trapiness"]:
+        if rng.randint(1, 100) <= gen_params["walliness"]:
+            self.walls[rng.choice(['N', 'S', 'E', 'W'])] = True
+        if rng.randint(1, 100) <= gen_params["trapiness"]:
             self.traps.append("Trap")
-        if random.randint(1, 100) <= gen_params["geminess"]:
+        if rng.randint(1, 100) <= gen_params["geminess"]:
             #if gem then mandatory monster
             self.treasures.append(Treasure(TreasureType.GEMS))
-            self.monsters.append(Monster.random_monster(nemesisiness=gen_params["nemesisiness"]))
+            self.monsters.append(Monster.random_monster(nemesisiness=gen_params["nemesisiness"], rng=rng))
         else:
             #no gem then MAYBE treasure
-
-            #cannot have gems here
-            no_gem_list = list(TreasureType)
-            no_gem_list.remove(TreasureType.GEMS)
-
-            if random.randint(1, 100) <= gen_params["treasuriness"]:
-                treasure_type = random.choice(no_gem_list)
+            if rng.randint(1, 100) <= gen_params["treasuriness"]:
+                treasure_type = rng.choice(NO_GEM_TREASURES)
                 self.treasures.append(Treasure(treasure_type))
                 # maybe double treasure?
-                if random.randint(1, 100) <= gen_params["treasuriness_double"]:
-                    treasure_type = random.choice(no_gem_list)
+                if rng.randint(1, 100) <= gen_params["treasuriness_double"]:
+                    treasure_type = rng.choice(NO_GEM_TREASURES)
                     self.treasures.append(Treasure(treasure_type))
             #maybe monster
-            if random.randint(1, 100) <= gen_params["monsteriness"]:
-                self.monsters.append(Monster.random_monster(nemesisiness=gen_params["nemesisiness"]))
+            if rng.randint(1, 100) <= gen_params["monsteriness"]:
+                self.monsters.append(Monster.random_monster(nemesisiness=gen_params["nemesisiness"], rng=rng))
+
 
+    def clear_contents(self):
+        """Remove monsters, treasures and traps."""
+        self.monsters.clear()
+        self.treasures.clear()
+        self.traps.clear()
 
     def is_empty(self):
         return not (self.traps or self.treasures or self.monsters or self.boss_id != 0)
     
 
     @classmethod
-    def generate_random_cell(cls, gen_params:dict):
+    def generate_random_cell(cls, gen_params:dict, rng=random):
         cell = cls()
-        cell.randomize(gen_params)
+        cell.randomize(gen_params, rng=rng)
         return cell
 
+    def to_dict(self):
+        return {
+            "walls": [direction for direction, has_wall in self.walls.items() if has_wall],
+            "traps": len(self.traps),
+            "treasures": [treasure.treasure_type.value for treasure in self.treasures],
+            "monsters": [
+                {"name": monster.name, "nemesis": [[hero_class.value, level] for hero_class, level in monster.nemesis_classes]}
+                for monster in self.monsters
+            ],
+            "boss_id": self.boss_id,
+            "is_starting_cell": self.is_starting_cell,
+            "is_warp_cell": self.is_warp_cell,
+        }
+
     def __repr__(self):
         return f"Cell(Walls: {self.walls}, Traps: {self.traps}, Treasures: {self.treasures}, Monsters: {self.monsters})"
 
 
+class TrackedList(list):
+    """List calling on_change after every change, contents of a TrackedCell."""
+
+    def __init__(self, values, on_change):
+        super().__init__(values)
+        self.on_change = on_change
+
+    def __reduce__(self):
+        #copies and pickles are plain lists
+        return (list, (list(self),))
+
+
+def _notify_after(method):
+    def changing(self, *args, **kwargs):
+        result = method(self, *args, **kwargs)
+        self.on_change()
+        return result
+    return changing
+
+for _name in ("append", "extend", "insert", "remove", "pop", "clear", "sort", "reverse", "__setitem__", "__delitem__", "__iadd__", "__imul__"):
+    setattr(TrackedList, _name, _notify_after(getattr(list, _name)))
+
+
+class TrackedCell(Cell):
+    """Cell of a grid tracking its changes (see Grid.track_changes), marks itself dirty when edited.
+
+    Walls must be changed with add_wall/remove_wall, not through the walls dict.
+    """
+
+    def __setattr__(self, name, value):
+        if isinstance(value, list):
+            value = TrackedList(value, self.changed)
+        super().__setattr__(name, value)
+        self.changed()
+
+    def changed(self):
+        self.grid.mark_dirty(self.x, self.y)
+
+    def add_wall(self, direction):
+        super().add_wall(direction)
+        self.changed()
+
+    def remove_wall(self, direction):
+        super().remove_wall(direction)
+        self.changed()
+
+    @classmethod
+    def track(cls, cell, grid, x, y):
+        """Turn the Cell of grid at (x, y) into a TrackedCell."""
+        cell.__class__ = cls
+        state = vars(cell)
+        state.update(grid=grid, x=x, y=y)
+        for name, value in state.items():
+            if isinstance(value, list):
+                state[name] = TrackedList(value, cell.changed)
+
+
+# Bits of an edge in the EdgeIndex, 0 is a door
+EDGE_WALL = 1
+EDGE_WARP = 2   # side warp, on the outer left/right edge of a warp cell
+EDGE_START = 4  # start, on the outer bottom edge of a starting cell
+
+class EdgeIndex:
+    """Every edge of a grid resolved once, shared by the two cells it separates.
+
+    horizontal[y][x] is the top edge of cell (x, y), horizontal[height] the bottom border.
+    vertical[y][x] is the left edge of cell (x, y), vertical[y][width] the right border.
+    Values are EDGE_* bits: an edge is a wall if either of its cells has a wall there.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.horizontal = [bytearray(width) for _ in range(height + 1)]
+        self.vertical = [bytearray(width + 1) for _ in range(height)]
+
+
+    def edges(self, cells=None):
+        """(x1, y1, x2, y2, value) of every edge, in cell units.
+
+        cells=(x0, y0, x1, y1) limits it to the edges around the cells x0 <= x < x1, y0 <= y < y1.
+        """
+        x0, y0, x1, y1 = cells if cells is not None else (0, 0, self.width, self.height)
+        for y in range(y0, y1 + 1):
+            row = self.horizontal[y]
+            for x in range(x0, x1):
+                yield x, y, x + 1, y, row[x]
+        for y in range(y0, y1):
+            row = self.vertical[y]
+            for x in range(x0, x1 + 1):
+                yield x, y, x, y + 1, row[x]
+
+
+def check_engine(engine):
+    """engine if it is one of ENGINES, else ValueError."""
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine}, choose from {', '.join(ENGINES)}")
+    return engine
+
+
 class Grid:
     # Walliness factor for random grid generation (percentage of chance of having walls)
     WALLINESS = 25
@@ -110,14 +235,40 @@ class Grid:
     MONSTERINESS = 30
     # Other non-percentage factors 
     NEMESISINESS = 2  # How many different hero classes a monster can be nemesis to
-
-    def __init__(self, width = 6, height = 7):
+    # A good grid has at least this ratio of non-empty cells
+    GOOD_FILL_RATIO = 0.3
+    # Not good grids get empty cells filled (repaired) instead of being generated again
+    REPAIR = False
+    # A good grid also lets the heroes reach every boss and every gem (see playability.analyze)
+    CHECK_PLAYABLE = False
+    # Grids of more than CHUNK_SIZE x CHUNK_SIZE cells roll their cells in chunks of that size over
+    # CHUNK_JOBS processes (None: one per core), see grid_chunked. 0 never chunks
+    CHUNK_SIZE = 0
+    CHUNK_JOBS = None
+
+    def __init__(self, width = 6, height = 7, seed=None, engine="classic"):
         self.width = width
         self.height = height
-
-
-    def generate(self, check_good=True):
-        gen_params = {
+        # "classic" rolls each cell in turn, "vectorized" rolls the whole grid at once with NumPy
+        self.engine = check_engine(engine)
+        self.cells = None
+        # Each grid has its own random generator: same seed + same parameters = same board
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        # Cost of the last generate(): whole grids thrown away, cells filled by the repair
+        self.regenerations = 0
+        self.repaired_cells = 0
+        # Timers and counters of generate(), see stats.Stats
+        self.stats = NO_STATS
+        # Consumer (a renderer): cells changed since its last take_dirty(), None when changes are not tracked
+        self.dirty = None
+        # Process pool rolling the chunks while generate() runs, see grid_chunked
+        self.chunk_pool = None
+
+
+    def gen_params(self):
+        """Generation parameters as passed to the cells."""
+        return {
             "walliness": self.WALLINESS,
             "trapiness": self.TRAPINESS,
             "geminess": self.GEMINESS,
@@ -127,36 +278,100 @@ class Grid:
             "nemesisiness": self.NEMESISINESS
         }
 
-        while True:
-            #make grid
-            self.cells = [[Cell.generate_random_cell(gen_params) for _ in range(self.width)] for _ in range(self.height)]
-            #add bosses
-            self.randomize_bosses(bosses_count=3)
-            #cosmetics
-            self.fence_grid()
-            self.add_starting_cell()
-            self.add_warps(warp_count=2)
 
-            #check if good
-            if not check_good or self.is_good():
-                break
-            print("Regenerating grid, not good enough...")
+    def generate(self, check_good=True):
+        gen_params = self.gen_params()
+        #start over from the seed so generating twice gives the same board
+        self.rng.seed(self.seed)
+        self.regenerations = 0
+        self.repaired_cells = 0
+        #a whole new board, nothing to track against
+        self.dirty = None
+
+        stats = self.stats
+        #every regeneration of a chunked grid rolls on the same process pool
+        with self.generation_pool():
+            while True:
+                #make grid
+                with stats.phase("make_cells"):
+                    self.make_cells(gen_params)
+                #add bosses
+                with stats.phase("randomize_bosses"):
+                    self.randomize_bosses(bosses_count=3)
+                #cosmetics
+                with stats.phase("fence_and_start"):
+                    self.fence_grid()
+                    self.add_starting_cell()
+                with stats.phase("add_warps"):
+                    self.add_warps(warp_count=2)
+
+                #check if good
+                if not check_good:
+                    break
+                with stats.phase("is_good"):
+                    good = self.is_good()
+                if self.REPAIR and not good:
+                    with stats.phase("repair"):
+                        repaired = self.repair(gen_params)
+                    self.repaired_cells += repaired
+                    stats.count("repaired_cells", repaired)
+                    with stats.phase("is_good"):
+                        good = self.is_good()
+                if good and self.CHECK_PLAYABLE:
+                    with stats.phase("playability"):
+                        good = self.is_playable()
+                    if not good:
+                        stats.count("unplayable")
+                if good:
+                    break
+                #counted, not printed: workers and batch runs make thousands of boards
+                self.regenerations += 1
+                stats.count("regenerations")
+
+
+    def is_chunked(self):
+        return self.CHUNK_SIZE and self.width * self.height > self.CHUNK_SIZE * self.CHUNK_SIZE
+
+
+    def generation_pool(self):
+        """Context sharing one chunk process pool between the make_cells() calls in it, when chunked."""
+        if not self.is_chunked():
+            return contextlib.nullcontext()
+        import grid_chunked
+        return grid_chunked.generation_pool(self)
+
+
+    def make_cells(self, gen_params:dict):
+        """Fill the grid with random cells."""
+        if self.is_chunked():
+            import grid_chunked
+            self.cells = grid_chunked.make_cells(self, gen_params)
+            return
+        if self.engine == "vectorized":
+            import grid_vectorized
+            self.cells = grid_vectorized.make_cells(self, gen_params)
+            return
+        self.cells = [[Cell.generate_random_cell(gen_params, rng=self.rng) for _ in range(self.width)] for _ in range(self.height)]
 
 
     def randomize_bosses(self, bosses_count):
+        if self.engine == "vectorized":
+            import grid_vectorized
+            grid_vectorized.randomize_bosses(self, bosses_count)
+            return
         placed_bosses = 0
         while placed_bosses < bosses_count:
-            x = random.randint(0, self.width - 1)
-            y = random.randint(0, self.height - 1)
+            x = self.rng.randint(0, self.width - 1)
+            y = self.rng.randint(0, self.height - 1)
             cell = self.get_cell(x, y)
             if cell.boss_id == 0:  # No boss assigned yet
                 cell.boss_id = placed_bosses + 1  # Assign a unique boss ID
                 placed_bosses += 1
 
                 #if boss the no monster no treasure no trap
-                cell.monsters.clear()
-                cell.treasures.clear()
-                cell.traps.clear()
+                cell.clear_contents()
+            else:
+                self.stats.count("boss_retries")
 
 
     def fence_grid(self):
@@ -182,16 +397,23 @@ class Grid:
             #avoid endless loops
             warp_count = self.height
 
+        if self.engine == "vectorized":
+            import grid_vectorized
+            grid_vectorized.add_warps(self, warp_count)
+            return
+
         for _ in range(warp_count):
             done = False
             while not done:
-                y = random.randint(0, self.height - 1)
+                y = self.rng.randint(0, self.height - 1)
                 left_cell = self.get_cell(0, y)
                 right_cell = self.get_cell(self.width - 1, y)
                 if not left_cell.is_warp_cell and not right_cell.is_warp_cell:
                     left_cell.is_warp_cell = True
                     right_cell.is_warp_cell = True
                     done = True
+                else:
+                    self.stats.count("warp_retries")
 
 
     def __repr__(self):
@@ -203,6 +425,15 @@ class Grid:
             grid_repr += "||\n"
         return grid_repr
     
+    def to_dict(self):
+        """Board as plain JSON-able data, rows of cells from the top."""
+        return {
+            "seed": self.seed,
+            "width": self.width,
+            "height": self.height,
+            "cells": [[self.get_cell(x, y).to_dict() for x in range(self.width)] for y in range(self.height)],
+        }
+
     def get_cell(self, x, y):
         if 0 <= x < self.width and 0 <= y < self.height:
             return self.cells[y][x]
@@ -210,8 +441,129 @@ class Grid:
             raise IndexError("Cell coordinates out of bounds")
         
 
+    def edge_index(self) -> EdgeIndex:
+        """Resolve every edge once from the walls of both sides, plus warps and starts."""
+        edges = EdgeIndex(self.width, self.height)
+        for y, row in enumerate(self.cells):
+            top = edges.horizontal[y]
+            bottom = edges.horizontal[y + 1]
+            sides = edges.vertical[y]
+            for x, cell in enumerate(row):
+                walls = cell.walls
+                if walls['N']:
+                    top[x] = EDGE_WALL
+                if walls['S']:
+                    bottom[x] = EDGE_WALL
+                if walls['W']:
+                    sides[x] = EDGE_WALL
+                if walls['E']:
+                    sides[x + 1] = EDGE_WALL
+        self.mark_warps_and_starts(edges)
+        return edges
+
+
+    def update_edge_index(self, edges: EdgeIndex, cells):
+        """Resolve again the four edges of each (x, y) of cells, after these cells changed."""
+        for x, y in cells:
+            cell = self.get_cell(x, y)
+            walls = cell.walls
+            top = walls['N'] or (y > 0 and self.get_cell(x, y - 1).walls['S'])
+            bottom = walls['S'] or (y < self.height - 1 and self.get_cell(x, y + 1).walls['N'])
+            left = walls['W'] or (x > 0 and self.get_cell(x - 1, y).walls['E'])
+            right = walls['E'] or (x < self.width - 1 and self.get_cell(x + 1, y).walls['W'])
+            edges.horizontal[y][x] = EDGE_WALL if top else 0
+            edges.horizontal[y + 1][x] = (EDGE_WALL if bottom else 0) | (EDGE_START if y == self.height - 1 and cell.is_starting_cell else 0)
+            edges.vertical[y][x] = (EDGE_WALL if left else 0) | (EDGE_WARP if x == 0 and cell.is_warp_cell else 0)
+            edges.vertical[y][x + 1] = (EDGE_WALL if right else 0) | (EDGE_WARP if x == self.width - 1 and cell.is_warp_cell else 0)
+
+
+    def track_changes(self, consumer=None):
+        """Start recording the cells changed by edits for consumer, see take_dirty().
+
+        Each consumer (a renderer) gets its own record, so taking the changes of one leaves the
+        others' pending.
+        """
+        for y, row in enumerate(self.cells):
+            for x, cell in enumerate(row):
+                if not isinstance(cell, TrackedCell):
+                    TrackedCell.track(cell, self, x, y)
+        self.start_record(consumer)
+
+
+    def start_record(self, consumer):
+        if self.dirty is None:
+            self.dirty = {}
+        self.dirty[consumer] = set()
+
+
+    def is_tracked(self, consumer=None):
+        return self.dirty is not None and consumer in self.dirty
+
+
+    def mark_dirty(self, x, y):
+        if self.dirty is not None:
+            for cells in self.dirty.values():
+                cells.add((x, y))
+
+
+    def take_dirty(self, consumer=None):
+        """(x, y) of the cells changed since the last call for consumer, and start again from none."""
+        dirty = self.dirty[consumer]
+        self.dirty[consumer] = set()
+        return dirty
+
+
+    def mark_warps_and_starts(self, edges: EdgeIndex):
+        #starts only on the bottom border, warps only on the left and right borders
+        bottom = edges.horizontal[self.height]
+        for x in range(self.width):
+            if self.get_cell(x, self.height - 1).is_starting_cell:
+                bottom[x] |= EDGE_START
+        for y in range(self.height):
+            if self.get_cell(0, y).is_warp_cell:
+                edges.vertical[y][0] |= EDGE_WARP
+            if self.get_cell(self.width - 1, y).is_warp_cell:
+                edges.vertical[y][self.width] |= EDGE_WARP
+
+
+    def filled_cells(self):
+        """Number of cells with something in them."""
+        return sum(1 for row in self.cells for cell in row if not cell.is_empty())
+
+
     def is_good(self):
         """Check if good - need more 30% of cells to have something."""
         total_cells = self.width * self.height
-        filled_cells = sum(1 for row in self.cells for cell in row if not cell.is_empty())
-        return (float(filled_cells) / float(total_cells)) >= 0.3
\ No newline at end of file
+        return (float(self.filled_cells()) / float(total_cells)) >= self.GOOD_FILL_RATIO
+
+
+    def is_playable(self):
+        """Check if every boss and every gem can be reached from the starting cells."""
+        import playability
+        return playability.analyze(self).is_playable()
+
+
+    def repair(self, gen_params:dict):
+        """Fill random empty cells until the fill ratio is good, returns how many were filled.
+
+        Each filled cell gets contents rolled with the usual odds (re-rolled while empty),
+        walls, bosses, warps and starting cells are left as they are.
+        """
+        total_cells = self.width * self.height
+        filled_cells = self.filled_cells()
+        missing = max(0, math.ceil(self.GOOD_FILL_RATIO * total_cells) - filled_cells)
+        if missing == 0:
+            return 0
+        if not (gen_params["trapiness"] or gen_params["geminess"] or gen_params["treasuriness"] or gen_params["monsteriness"]):
+            raise ValueError("Cannot repair the grid: trapiness, geminess, treasuriness and monsteriness are all 0")
+
+        empty_cells = [(x, y) for y in range(self.height) for x in range(self.width) if self.get_cell(x, y).is_empty()]
+        for x, y in self.rng.sample(empty_cells, min(missing, len(empty_cells))):
+            filler = Cell.generate_random_cell(gen_params, rng=self.rng)
+            while filler.is_empty():
+                filler = Cell.generate_random_cell(gen_params, rng=self.rng)
+            cell = self.get_cell(x, y)
+            cell.traps = filler.traps
+            cell.treasures = filler.treasures
+            cell.monsters = filler.monsters
+        return min(missing, len(empty_cells))
\ No newline at end of file
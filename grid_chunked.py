@@ -0,0 +1,131 @@
+import contextlib
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from grid import Cell, Monster, Treasure
+from grid_compact import CompactGrid, TREASURE_CODES, MONSTER_CODES, WALL_BITS, monsters_code
+
+# Walls of a Cell for each walls mask, copied into the cells
+CELL_WALLS = [{direction: bool(mask & bit) for direction, bit in WALL_BITS.items()} for mask in range(16)]
+
+
+def chunk_boxes(width, height, chunk_size):
+    """(left, top, width, height) of the square chunks covering the grid, row by row."""
+    return [
+        (left, top, min(chunk_size, width - left), min(chunk_size, height - top))
+        for top in range(0, height, chunk_size)
+        for left in range(0, width, chunk_size)
+    ]
+
+
+def chunk_seed(base_seed, left, top):
+    """Seed of the chunk at (left, top), the same whatever the number of processes."""
+    digest = hashlib.blake2b(f"{base_seed}:{left}:{top}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _make_chunk(engine, gen_params, seed, box):
+    """Cells of one chunk, rolled by a CompactGrid of the chunk size with the grid engine.
+
+    Treasure and monster codes only mean something in this process: their values come along.
+    """
+    left, top, width, height = box
+    chunk = CompactGrid(width, height, seed=seed, engine=engine)
+    chunk.make_cells(gen_params)
+    treasures = {code: TREASURE_CODES[code] for code in set(chunk.treasures)}
+    monsters = {code: MONSTER_CODES[code] for code in set(chunk.monsters)}
+    return box, chunk.walls, chunk.traps, chunk.treasures, chunk.monsters, treasures, monsters
+
+
+def _lookup(values, code_of, dtype):
+    """Chunk codes to this process codes."""
+    lookup = np.zeros(max(values) + 1, dtype=dtype)
+    for code, value in values.items():
+        lookup[code] = code_of(value)
+    return lookup
+
+
+@contextlib.contextmanager
+def generation_pool(grid):
+    """Process pool kept in grid.chunk_pool while it lasts, for every make_cells() of one generate()."""
+    with ProcessPoolExecutor(max_workers=grid.CHUNK_JOBS) as pool:
+        grid.chunk_pool = pool
+        try:
+            yield pool
+        finally:
+            grid.chunk_pool = None
+
+
+def rolled_chunks(grid, gen_params: dict):
+    """Results of _make_chunk for every chunk of the grid, in order, as they come.
+
+    Rolled on grid.chunk_pool, or on a pool of their own outside of generate().
+    """
+    base_seed = grid.rng.getrandbits(64)
+    boxes = chunk_boxes(grid.width, grid.height, grid.CHUNK_SIZE)
+    executor = contextlib.nullcontext(grid.chunk_pool) if grid.chunk_pool is not None else ProcessPoolExecutor(max_workers=grid.CHUNK_JOBS)
+    with executor as pool:
+        futures = [pool.submit(_make_chunk, grid.engine, gen_params, chunk_seed(base_seed, left, top), (left, top, width, height))
+                   for left, top, width, height in boxes]
+        for future in futures:
+            yield future.result()
+    grid.stats.count("chunks", len(boxes))
+
+
+def fill_compact(grid: CompactGrid, gen_params: dict):
+    """Roll the cells of the grid chunk by chunk over grid.CHUNK_JOBS processes, into its arrays.
+
+    Each chunk rolls its cells like a whole board would (same engine and odds), from a seed made
+    from the grid rng and the chunk position. A wall belongs to the cell that rolled it and edges
+    are resolved from both sides, so the seams are no different from the inside of a chunk.
+    Bosses, fence, starting cells and warps are placed afterwards on the whole grid by generate().
+    """
+    grid.allocate()
+    walls = np.frombuffer(grid.walls, dtype=np.uint8).reshape(grid.height, grid.width)
+    traps = np.frombuffer(grid.traps, dtype=np.uint8).reshape(grid.height, grid.width)
+    treasures = np.frombuffer(grid.treasures, dtype=np.uint16).reshape(grid.height, grid.width)
+    monsters = np.frombuffer(grid.monsters, dtype=np.uint32).reshape(grid.height, grid.width)
+
+    for (left, top, width, height), chunk_walls, chunk_traps, chunk_treasures, chunk_monsters, treasure_values, monster_values in rolled_chunks(grid, gen_params):
+        area = (slice(top, top + height), slice(left, left + width))
+        walls[area] = np.frombuffer(chunk_walls, dtype=np.uint8).reshape(height, width)
+        traps[area] = np.frombuffer(chunk_traps, dtype=np.uint8).reshape(height, width)
+        treasure_codes = _lookup(treasure_values, TREASURE_CODES.code, np.uint16)
+        treasures[area] = treasure_codes[np.frombuffer(chunk_treasures, dtype=np.uint16)].reshape(height, width)
+        monster_codes = _lookup(monster_values, monsters_code, np.uint32)
+        monsters[area] = monster_codes[np.frombuffer(chunk_monsters, dtype=np.uint32)].reshape(height, width)
+
+
+def make_cells(grid, gen_params: dict):
+    """Rows of Cell for a Grid, rolled in chunks like fill_compact (same board).
+
+    Each chunk is turned into Cells as soon as it comes back, while the workers roll the next ones.
+    """
+    rows = [[None] * grid.width for _ in range(grid.height)]
+    for (left, top, width, height), *arrays in rolled_chunks(grid, gen_params):
+        for y, row in enumerate(_cells(width, height, *arrays), top):
+            rows[y][left:left + width] = row
+    return rows
+
+
+def _cells(width, height, walls, traps, treasures, monsters, treasure_values, monster_values):
+    """Rows of new Cell of a chunk from its arrays, none of them shared with the chunk or another cell."""
+    rows = []
+    index = 0
+    for _ in range(height):
+        row = []
+        for _ in range(width):
+            cell = Cell()
+            cell.walls = CELL_WALLS[walls[index]].copy()
+            if traps[index]:
+                cell.traps = ["Trap"] * traps[index]
+            if treasures[index]:
+                cell.treasures = [Treasure(treasure_type) for treasure_type in treasure_values[treasures[index]]]
+            if monsters[index]:
+                cell.monsters = [Monster(monster.name, list(monster.nemesis_classes)) for monster in monster_values[monsters[index]]]
+            row.append(cell)
+            index += 1
+        rows.append(row)
+    return rows
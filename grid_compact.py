@@ -0,0 +1,306 @@
+from array import array
+import sys
+import time
+import tracemalloc
+
+from grid import Grid, Cell, Monster, Treasure, TreasureType, EdgeIndex, EDGE_WALL
+
+# One bit per wall in the walls mask
+WALL_BITS = {'N': 1, 'S': 2, 'E': 4, 'W': 8}
+# Bits of the flags array
+FLAG_STARTING = 1
+FLAG_WARP = 2
+
+
+class InternTable:
+    """Gives a small integer code to each distinct value, code 0 is the empty tuple."""
+
+    def __init__(self):
+        self.values = [()]
+        self.codes = {(): 0}
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+
+# Flyweights shared by every CompactGrid of the process: never mutate what the views return
+_treasures = {treasure_type: Treasure(treasure_type) for treasure_type in TreasureType}
+_monsters = {}
+
+def intern_monster(name, nemesis_classes):
+    key = (name, tuple(nemesis_classes))
+    monster = _monsters.get(key)
+    if monster is None:
+        monster = Monster(name, list(nemesis_classes))
+        _monsters[key] = monster
+    return monster
+
+# Code tables: a cell stores the code of its tuple of treasure types / tuple of monsters
+TREASURE_CODES = InternTable()
+MONSTER_CODES = InternTable()
+
+def treasures_code(treasures):
+    return TREASURE_CODES.code(tuple(treasure.treasure_type for treasure in treasures))
+
+def monsters_code(monsters):
+    return MONSTER_CODES.code(tuple(intern_monster(monster.name, monster.nemesis_classes) for monster in monsters))
+
+
+class CompactCell:
+    """Lightweight view on one cell of a CompactGrid, same interface as Cell.
+
+    The lists it returns are copies: assign traps/treasures/monsters to change them (the
+    assignment marks the cell dirty when the grid tracks its changes).
+    """
+    __slots__ = ("grid", "index")
+
+    def __init__(self, grid, index):
+        self.grid = grid
+        self.index = index
+
+    @property
+    def walls(self):
+        mask = self.grid.walls[self.index]
+        return {direction: bool(mask & bit) for direction, bit in WALL_BITS.items()}
+
+    def add_wall(self, direction):
+        if direction in WALL_BITS:
+            self.grid.walls[self.index] |= WALL_BITS[direction]
+            self.changed()
+
+    def remove_wall(self, direction):
+        if direction in WALL_BITS:
+            self.grid.walls[self.index] &= ~WALL_BITS[direction]
+            self.changed()
+
+    def changed(self):
+        self.grid.mark_dirty(self.index % self.grid.width, self.index // self.grid.width)
+
+    @property
+    def traps(self):
+        return ["Trap"] * self.grid.traps[self.index]
+
+    @traps.setter
+    def traps(self, traps):
+        self.grid.traps[self.index] = len(traps)
+        self.changed()
+
+    @property
+    def treasures(self):
+        return [_treasures[treasure_type] for treasure_type in TREASURE_CODES[self.grid.treasures[self.index]]]
+
+    @treasures.setter
+    def treasures(self, treasures):
+        self.grid.treasures[self.index] = treasures_code(treasures)
+        self.changed()
+
+    @property
+    def monsters(self):
+        return list(MONSTER_CODES[self.grid.monsters[self.index]])
+
+    @monsters.setter
+    def monsters(self, monsters):
+        self.grid.monsters[self.index] = monsters_code(monsters)
+        self.changed()
+
+    @property
+    def items(self):
+        return []
+
+    @property
+    def warps(self):
+        return []
+
+    @property
+    def boss_id(self):
+        return self.grid.bosses[self.index]
+
+    @boss_id.setter
+    def boss_id(self, boss_id):
+        self.grid.bosses[self.index] = boss_id
+        self.changed()
+
+    @property
+    def is_starting_cell(self):
+        return bool(self.grid.flags[self.index] & FLAG_STARTING)
+
+    @is_starting_cell.setter
+    def is_starting_cell(self, value):
+        self._set_flag(FLAG_STARTING, value)
+
+    @property
+    def is_warp_cell(self):
+        return bool(self.grid.flags[self.index] & FLAG_WARP)
+
+    @is_warp_cell.setter
+    def is_warp_cell(self, value):
+        self._set_flag(FLAG_WARP, value)
+
+    def _set_flag(self, flag, value):
+        if value:
+            self.grid.flags[self.index] |= flag
+        else:
+            self.grid.flags[self.index] &= ~flag
+        self.changed()
+
+    def clear_contents(self):
+        self.grid.traps[self.index] = 0
+        self.grid.treasures[self.index] = 0
+        self.grid.monsters[self.index] = 0
+        self.changed()
+
+    def is_empty(self):
+        grid = self.grid
+        i = self.index
+        return not (grid.traps[i] or grid.treasures[i] or grid.monsters[i] or grid.bosses[i])
+
+    to_dict = Cell.to_dict
+
+    def __repr__(self):
+        return f"Cell(Walls: {self.walls}, Traps: {self.traps}, Treasures: {self.treasures}, Monsters: {self.monsters})"
+
+
+class CompactGrid(Grid):
+    """Grid stored as flat arrays (structure of arrays) instead of Cell objects.
+
+    Same seed, same parameters: same board as Grid. get_cell() returns a CompactCell view
+    so the renderers work unchanged.
+    """
+
+    def allocate(self):
+        size = self.width * self.height
+        self.walls = array('B', bytes(size))     # WALL_BITS mask
+        self.flags = array('B', bytes(size))     # FLAG_STARTING | FLAG_WARP
+        self.traps = array('B', bytes(size))     # number of traps
+        self.treasures = array('H', bytes(2 * size))  # TREASURE_CODES
+        self.monsters = array('I', bytes(4 * size))   # MONSTER_CODES
+        self.bosses = array('B', bytes(size))    # boss id, 0 is no boss
+
+
+    @property
+    def cells(self):
+        if self.walls is None:
+            return None
+        return [[self.get_cell(x, y) for x in range(self.width)] for y in range(self.height)]
+
+    @cells.setter
+    def cells(self, rows):
+        """Pack rows of Cell (or None to forget the board)."""
+        self.dirty = None
+        if rows is None:
+            self.walls = None
+            return
+        self.allocate()
+        for y, row in enumerate(rows):
+            for x, cell in enumerate(row):
+                self.pack(y * self.width + x, cell)
+
+
+    @classmethod
+    def from_grid(cls, grid: Grid):
+        compact = cls(grid.width, grid.height, seed=grid.seed)
+        for name in ("WALLINESS", "TRAPINESS", "GEMINESS", "TREASURINESS", "TREASURINESS_DOUBLE", "MONSTERINESS", "NEMESISINESS"):
+            setattr(compact, name, getattr(grid, name))
+        compact.cells = grid.cells
+        return compact
+
+
+    def pack(self, index, cell: Cell):
+        mask = 0
+        for direction, has_wall in cell.walls.items():
+            if has_wall:
+                mask |= WALL_BITS[direction]
+        self.walls[index] = mask
+        self.flags[index] = (FLAG_STARTING if cell.is_starting_cell else 0) | (FLAG_WARP if cell.is_warp_cell else 0)
+        self.traps[index] = len(cell.traps)
+        self.treasures[index] = treasures_code(cell.treasures)
+        self.monsters[index] = monsters_code(cell.monsters)
+        self.bosses[index] = cell.boss_id
+
+
+    def make_cells(self, gen_params:dict):
+        if self.is_chunked():
+            import grid_chunked
+            grid_chunked.fill_compact(self, gen_params)
+            return
+        if self.engine == "vectorized":
+            import grid_vectorized
+            grid_vectorized.fill_compact(self, gen_params)
+            return
+        #one temporary Cell at a time, same random draws as Grid
+        self.allocate()
+        for index in range(self.width * self.height):
+            self.pack(index, Cell.generate_random_cell(gen_params, rng=self.rng))
+
+
+    def track_changes(self, consumer=None):
+        """Start recording the cells changed by edits for consumer, the views report every change."""
+        self.start_record(consumer)
+
+
+    def get_cell(self, x, y):
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return CompactCell(self, y * self.width + x)
+        else:
+            raise IndexError("Cell coordinates out of bounds")
+
+
+    def edge_index(self) -> EdgeIndex:
+        """Resolve every edge once straight from the walls masks."""
+        edges = EdgeIndex(self.width, self.height)
+        walls = self.walls
+        for y in range(self.height):
+            top = edges.horizontal[y]
+            bottom = edges.horizontal[y + 1]
+            sides = edges.vertical[y]
+            start = y * self.width
+            for x, mask in enumerate(walls[start:start + self.width]):
+                if mask:
+                    if mask & WALL_BITS['N']:
+                        top[x] = EDGE_WALL
+                    if mask & WALL_BITS['S']:
+                        bottom[x] = EDGE_WALL
+                    if mask & WALL_BITS['E']:
+                        sides[x + 1] = EDGE_WALL
+                    if mask & WALL_BITS['W']:
+                        sides[x] = EDGE_WALL
+        self.mark_warps_and_starts(edges)
+        return edges
+
+
+    def filled_cells(self):
+        """Number of cells with something in them."""
+        return sum(1 for traps, treasures, monsters, boss in zip(self.traps, self.treasures, self.monsters, self.bosses) if traps or treasures or monsters or boss)
+
+
+def _measure(grid_class, width, height, seed):
+    tracemalloc.start()
+    start = time.perf_counter()
+    grid = grid_class(width, height, seed=seed)
+    grid.generate(check_good=False)
+    generate_time = time.perf_counter() - start
+    start = time.perf_counter()
+    grid.is_good()
+    is_good_time = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return generate_time, is_good_time, current, peak
+
+
+if __name__ == "__main__":
+    # python grid_compact.py [width] [height]: memory and speed of Grid vs CompactGrid
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    height = int(sys.argv[2]) if len(sys.argv) > 2 else width
+    print(f"{width}x{height} grid, tracemalloc on")
+    for grid_class in (Grid, CompactGrid):
+        generate_time, is_good_time, current, peak = _measure(grid_class, width, height, seed=1)
+        print(f"{grid_class.__name__:12} generate {generate_time:6.2f}s  is_good {is_good_time * 1000:7.1f}ms  "
+              f"kept {current / 2**20:7.1f}MB  peak {peak / 2**20:7.1f}MB")
@@ -0,0 +1,130 @@
+from array import array
+
+import numpy as np
+
+from grid import Cell, Monster, Treasure, TreasureType, MONSTER_NAMES, HEROES, NO_GEM_TREASURES
+
+# Wall direction index as drawn by the rolls, same order as Cell.randomize choice
+WALL_DIRECTIONS = ['N', 'S', 'E', 'W']
+
+
+def numpy_rng(grid):
+    """NumPy generator seeded from the grid rng, so the vectorized engine is reproducible too."""
+    return np.random.default_rng(grid.rng.getrandbits(64))
+
+
+def roll_cells(rng, count, gen_params: dict) -> dict:
+    """All the random draws of count cells at once, same distribution as Cell.randomize.
+
+    Returns arrays of length count (monster details only for the cells having a monster).
+    """
+    def roll(name, size=count):
+        return rng.integers(1, 101, size=size) <= gen_params[name]
+
+    has_wall = roll("walliness")
+    wall_direction = rng.integers(0, len(WALL_DIRECTIONS), size=count)
+    has_trap = roll("trapiness")
+    #if gem then mandatory monster, no gem then maybe treasure (maybe two) and maybe monster
+    has_gem = roll("geminess")
+    treasure_count = np.where(has_gem, 0, roll("treasuriness") * (1 + roll("treasuriness_double")))
+    treasure_types = rng.integers(0, len(NO_GEM_TREASURES), size=(count, 2))
+    has_monster = has_gem | roll("monsteriness")
+
+    monster_cells = np.flatnonzero(has_monster)
+    monsters = len(monster_cells)
+    nemesisiness = min(gen_params["nemesisiness"], len(HEROES))
+    #random order of the hero classes per monster, the first nemesis_count ones are kept
+    hero_order = np.argsort(rng.random((monsters, len(HEROES))), axis=1)
+
+    return {
+        "has_wall": has_wall,
+        "wall_direction": wall_direction,
+        "has_trap": has_trap,
+        "has_gem": has_gem,
+        "treasure_count": treasure_count,
+        "treasure_types": treasure_types,
+        "monster_cells": monster_cells,
+        "monster_name": rng.integers(0, len(MONSTER_NAMES), size=monsters),
+        "nemesis_count": rng.integers(1, nemesisiness + 1, size=monsters),
+        "hero_order": hero_order,
+        "nemesis_level": rng.integers(1, 7, size=(monsters, len(HEROES))),
+    }
+
+
+def monster_details(rolls):
+    """(name, nemesis classes) for each monster of the rolls, in monster_cells order."""
+    names = rolls["monster_name"].tolist()
+    counts = rolls["nemesis_count"].tolist()
+    orders = rolls["hero_order"].tolist()
+    levels = rolls["nemesis_level"].tolist()
+    for name, count, order, level in zip(names, counts, orders, levels):
+        yield MONSTER_NAMES[name], [(HEROES[hero], level[hero]) for hero in order[:count]]
+
+
+def make_cells(grid, gen_params: dict):
+    """Rows of Cell for the grid, all rolled in one go."""
+    count = grid.width * grid.height
+    rolls = roll_cells(numpy_rng(grid), count, gen_params)
+
+    cells = [Cell() for _ in range(count)]
+    wall_direction = rolls["wall_direction"].tolist()
+    for index in np.flatnonzero(rolls["has_wall"]).tolist():
+        cells[index].walls[WALL_DIRECTIONS[wall_direction[index]]] = True
+    for index in np.flatnonzero(rolls["has_trap"]).tolist():
+        cells[index].traps.append("Trap")
+    for index in np.flatnonzero(rolls["has_gem"]).tolist():
+        cells[index].treasures.append(Treasure(TreasureType.GEMS))
+    treasure_count = rolls["treasure_count"].tolist()
+    treasure_types = rolls["treasure_types"].tolist()
+    for index in np.flatnonzero(rolls["treasure_count"]).tolist():
+        for slot in range(treasure_count[index]):
+            cells[index].treasures.append(Treasure(NO_GEM_TREASURES[treasure_types[index][slot]]))
+    for index, (name, nemesis_classes) in zip(rolls["monster_cells"].tolist(), monster_details(rolls)):
+        cells[index].monsters.append(Monster(name, nemesis_classes))
+
+    return [cells[y * grid.width:(y + 1) * grid.width] for y in range(grid.height)]
+
+
+def fill_compact(grid, gen_params: dict):
+    """Same as make_cells but straight into the arrays of a CompactGrid."""
+    from grid_compact import TREASURE_CODES, monsters_code
+
+    count = grid.width * grid.height
+    rolls = roll_cells(numpy_rng(grid), count, gen_params)
+    grid.allocate()
+
+    walls = np.where(rolls["has_wall"], 1 << rolls["wall_direction"], 0)
+    grid.walls = array('B', walls.astype(np.uint8).tobytes())
+    grid.traps = array('B', rolls["has_trap"].astype(np.uint8).tobytes())
+
+    #treasure combinations are few: intern them once, then map every cell to its code
+    gem_code = TREASURE_CODES.code((TreasureType.GEMS,))
+    combination = rolls["treasure_count"] * 16 + rolls["treasure_types"][:, 0] * 4 + rolls["treasure_types"][:, 1]
+    codes = np.zeros(64, dtype=np.uint16)
+    for key in np.unique(combination).tolist():
+        treasure_count, first, second = key // 16, (key // 4) % 4, key % 4
+        codes[key] = TREASURE_CODES.code(tuple(NO_GEM_TREASURES[t] for t in (first, second)[:treasure_count]))
+    treasures = np.where(rolls["has_gem"], gem_code, codes[combination]).astype(np.uint16)
+    grid.treasures = array('H', treasures.tobytes())
+
+    for index, (name, nemesis_classes) in zip(rolls["monster_cells"].tolist(), monster_details(rolls)):
+        grid.monsters[index] = monsters_code([Monster(name, nemesis_classes)])
+
+
+def randomize_bosses(grid, bosses_count):
+    """Bosses on distinct random cells: sampling without replacement instead of retrying."""
+    count = min(bosses_count, grid.width * grid.height)
+    positions = numpy_rng(grid).choice(grid.width * grid.height, size=count, replace=False)
+    for boss_id, position in enumerate(positions.tolist(), start=1):
+        cell = grid.get_cell(position % grid.width, position // grid.width)
+        cell.boss_id = boss_id
+        #if boss the no monster no treasure no trap
+        cell.clear_contents()
+
+
+def add_warps(grid, warp_count):
+    """Warps on distinct random rows."""
+    rows = numpy_rng(grid).choice(grid.height, size=warp_count, replace=False)
+    for y in rows.tolist():
+        grid.get_cell(0, y).is_warp_cell = True
+        grid.get_cell(grid.width - 1, y).is_warp_cell = True
@@ -0,0 +1,125 @@
+import numpy as np
+
+from grid import Grid, EdgeIndex, TreasureType, EDGE_WALL, EDGE_WARP, EDGE_START
+from grid_compact import CompactGrid, TREASURE_CODES
+
+
+def _bits(mask) -> int:
+    """Boolean array as an int, bit y * width + x set for each True cell."""
+    return int.from_bytes(np.packbits(mask.ravel(), bitorder="little").tobytes(), "little")
+
+
+def _cells(bits, width, count):
+    """(x, y) of every bit set among the first count."""
+    mask = np.unpackbits(np.frombuffer(bits.to_bytes((count + 7) // 8, "little"), dtype=np.uint8), bitorder="little")[:count]
+    return [(index % width, index // width) for index in np.flatnonzero(mask).tolist()]
+
+
+class PlayabilityReport:
+    """What the heroes can reach from the starting cells, see analyze()."""
+
+    def __init__(self, grid, reachable, boss_cells, boss_distances, gem_bits):
+        self.width = grid.width
+        self.height = grid.height
+        # bit y * width + x set for each reachable cell
+        self.reachable = reachable
+        # boss id: (x, y)
+        self.boss_cells = boss_cells
+        # boss id: fewest moves from a starting cell (warps count as one move), None if unreachable
+        self.boss_distances = boss_distances
+        self.unreachable_gems = bin(gem_bits & ~reachable).count("1")
+
+    @property
+    def reachable_count(self):
+        return bin(self.reachable).count("1")
+
+    @property
+    def unreachable_count(self):
+        return self.width * self.height - self.reachable_count
+
+    def unreachable_cells(self):
+        """(x, y) of the cells the heroes can never walk into."""
+        everything = (1 << (self.width * self.height)) - 1
+        return _cells(everything & ~self.reachable, self.width, self.width * self.height)
+
+    @property
+    def isolated_bosses(self):
+        return sorted(boss_id for boss_id, distance in self.boss_distances.items() if distance is None)
+
+    def is_playable(self):
+        """Every boss and every gem can be reached."""
+        return not self.isolated_bosses and self.unreachable_gems == 0
+
+    def __repr__(self):
+        return (f"PlayabilityReport({self.unreachable_count} unreachable cells, boss distances {self.boss_distances}, "
+                f"{self.unreachable_gems} unreachable gems)")
+
+
+def _contents(grid):
+    """Boss cells {id: (x, y)} and gem cells as bits, straight from the arrays of a CompactGrid."""
+    if isinstance(grid, CompactGrid):
+        bosses = np.frombuffer(grid.bosses, dtype=np.uint8)
+        boss_cells = {int(bosses[i]): (int(i) % grid.width, int(i) // grid.width) for i in np.flatnonzero(bosses)}
+        gem_codes = [code for code, value in enumerate(TREASURE_CODES.values) if TreasureType.GEMS in value]
+        gems = np.isin(np.frombuffer(grid.treasures, dtype=np.uint16), gem_codes)
+        return boss_cells, _bits(gems)
+    boss_cells = {}
+    gems = np.zeros(grid.width * grid.height, dtype=bool)
+    for y, row in enumerate(grid.cells):
+        for x, cell in enumerate(row):
+            if cell.boss_id:
+                boss_cells[cell.boss_id] = (x, y)
+            if cell.treasures and any(treasure.treasure_type == TreasureType.GEMS for treasure in cell.treasures):
+                gems[y * grid.width + x] = True
+    return boss_cells, _bits(gems)
+
+
+def analyze(grid : Grid, edges : EdgeIndex = None) -> PlayabilityReport:
+    """Flood fill from the starting cells through doors and side warps, one bitset step per move.
+
+    Walls are resolved from both sides like in the renderers (Grid.edge_index). A side warp
+    takes a hero from a warp cell on one border to the warp cell on the other border of the
+    same row.
+    """
+    width, height = grid.width, grid.height
+    if edges is None:
+        edges = grid.edge_index()
+    horizontal = np.frombuffer(b"".join(edges.horizontal), dtype=np.uint8).reshape(height + 1, width)
+    vertical = np.frombuffer(b"".join(edges.vertical), dtype=np.uint8).reshape(height, width + 1)
+
+    #cells whose edge in that direction is a door, the outer border never is
+    east = (vertical[:, 1:] & EDGE_WALL) == 0
+    east[:, -1] = False
+    west = (vertical[:, :-1] & EDGE_WALL) == 0
+    west[:, 0] = False
+    north = (horizontal[:-1] & EDGE_WALL) == 0
+    north[0] = False
+    south = (horizontal[1:] & EDGE_WALL) == 0
+    south[-1] = False
+    east, west, north, south = _bits(east), _bits(west), _bits(north), _bits(south)
+
+    warp_rows = ((vertical[:, 0] & EDGE_WARP) != 0) & ((vertical[:, width] & EDGE_WARP) != 0)
+    left_warps = np.zeros((height, width), dtype=bool)
+    left_warps[:, 0] = warp_rows
+    left_warps = _bits(left_warps)
+    right_warps = left_warps << (width - 1)
+
+    starts = np.zeros((height, width), dtype=bool)
+    starts[-1] = (horizontal[height] & EDGE_START) != 0
+    reached = frontier = _bits(starts)
+
+    boss_cells, gem_bits = _contents(grid)
+    boss_bits = {boss_id: 1 << (y * width + x) for boss_id, (x, y) in boss_cells.items()}
+    boss_distances = {boss_id: (0 if bit & reached else None) for boss_id, bit in boss_bits.items()}
+    distance = 0
+    while frontier:
+        distance += 1
+        step = (((frontier & east) << 1) | ((frontier & west) >> 1) | ((frontier & south) << width) | ((frontier & north) >> width)
+                | ((frontier & left_warps) << (width - 1)) | ((frontier & right_warps) >> (width - 1)))
+        frontier = step & ~reached
+        reached |= frontier
+        for boss_id, bit in boss_bits.items():
+            if boss_distances[boss_id] is None and frontier & bit:
+                boss_distances[boss_id] = distance
+
+    return PlayabilityReport(grid, reached, boss_cells, boss_distances, gem_bits)
@@ -0,0 +1,51 @@
+import struct
+import zlib
+
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# PNG row filter "Up": each byte minus the byte above it
+FILTER_UP = 2
+
+
+class PNGStreamWriter:
+    """Writes an RGB PNG band after band, never holding the whole image in memory."""
+
+    def __init__(self, file, width, height, compress_level=6):
+        self.file = file
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.compressor = zlib.compressobj(compress_level)
+        self.previous_row = np.zeros(width * 3, dtype=np.uint8)
+        file.write(PNG_SIGNATURE)
+        #8 bits per channel, RGB, deflate, adaptive filtering, no interlace
+        self.write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+
+    def write_chunk(self, kind, data):
+        self.file.write(struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data)))
+
+
+    def write_band(self, image):
+        """Next rows of the image, image must be width pixels wide."""
+        if image.size[0] != self.width:
+            raise ValueError(f"Band is {image.size[0]} pixels wide, expected {self.width}")
+        rows = np.asarray(image.convert("RGB"), dtype=np.uint8).reshape(image.size[1], self.width * 3)
+        above = np.vstack([self.previous_row[np.newaxis], rows[:-1]])
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = FILTER_UP
+        #uint8 arithmetic wraps around, which is what the filter wants
+        filtered[:, 1:] = rows - above
+        data = self.compressor.compress(filtered.tobytes())
+        if data:
+            self.write_chunk(b"IDAT", data)
+        self.previous_row = rows[-1].copy()
+        self.rows_written += image.size[1]
+
+
+    def close(self):
+        if self.rows_written != self.height:
+            raise ValueError(f"{self.rows_written} rows written, expected {self.height}")
+        self.write_chunk(b"IDAT", self.compressor.flush())
+        self.write_chunk(b"IEND", b"")
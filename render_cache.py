@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+
+from grid import Grid
+from renderer_basic import IMAGE_FORMATS
+
+# Bump when a change in the generation or rendering code makes old entries wrong
+CACHE_VERSION = 1
+
+
+def renderer_settings(renderer) -> dict:
+    """Everything that changes the pixels: renderer type, uppercase settings and sprite set."""
+    settings = {name: value for name, value in vars(renderer).items() if name.isupper()}
+    sprites = getattr(renderer, "sprites", None)
+    if sprites is not None:
+        #sprite files can be redrawn in place, so their modification time is part of the key
+        settings["sprites"] = {name: [path, os.stat(path).st_mtime_ns] for name, path in sprites.items()}
+    return {"renderer": type(renderer).__name__, "settings": settings}
+
+
+class RenderCache:
+    """On disk cache of rendered boards keyed by seed, Grid parameters and renderer settings.
+
+    Only valid for boards generated from their seed, a grid edited after generate() must not be cached.
+    """
+
+    def __init__(self, cache_dir="cache"):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+    def key(self, grid: Grid, renderer) -> str:
+        description = {
+            "version": CACHE_VERSION,
+            "seed": grid.seed,
+            "width": grid.width,
+            "height": grid.height,
+            "engine": grid.engine,
+            "repair": grid.REPAIR,
+            "check_playable": grid.CHECK_PLAYABLE,
+            #rolls under this ratio are thrown away: another ratio, another board for the same seed
+            "good_fill_ratio": grid.GOOD_FILL_RATIO,
+            "chunk_size": grid.CHUNK_SIZE if grid.is_chunked() else 0,
+            "generation": grid.gen_params(),
+            **renderer_settings(renderer),
+        }
+        encoded = json.dumps(description, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+
+    def path(self, key, image_format="png"):
+        """File of an entry, named after its format (the renderer IMAGE_FORMAT)."""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{image_format}")
+
+
+    def load(self, key, image_format="png"):
+        """Stored encoded bytes for this key, None if not rendered yet."""
+        try:
+            with open(self.path(key, image_format), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+    def store(self, key, data: bytes, image_format="png"):
+        path = self.path(key, image_format)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        #write aside then rename, so concurrent readers never see half a file
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+
+    def render(self, grid: Grid, renderer, image_format=None) -> bytes:
+        """Encoded bytes of the board (image_format, renderer IMAGE_FORMAT if None), generated and drawn only if not in the cache yet."""
+        image_format = image_format or renderer.IMAGE_FORMAT
+        key = self.key(grid, renderer)
+        data = self.load(key, image_format)
+        if data is None:
+            if grid.cells is None:
+                grid.generate()
+            data = renderer.to_bytes(grid, image_format)
+            self.store(key, data, image_format)
+        return data
+
+
+    def to_image(self, grid: Grid, renderer, filename="grid.png"):
+        """Same as renderer.to_image() but going through the cache, for the formats of IMAGE_FORMATS."""
+        extension = os.path.splitext(filename)[1][1:].lower()
+        if extension and extension not in IMAGE_FORMATS:
+            #other formats are not cached
+            if grid.cells is None:
+                grid.generate()
+            renderer.to_image(grid, filename)
+            return
+        #the format of the extension, as renderer.save() picks it
+        data = self.render(grid, renderer, IMAGE_FORMATS.get(extension))
+        with open(filename, "wb") as f:
+            f.write(data)
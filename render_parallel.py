@@ -0,0 +1,68 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from PIL import Image
+
+from grid import Grid
+from sprite_atlas import get_atlas
+
+# Bands per worker: smaller bands even out the work when some rows have more sprites
+BANDS_PER_JOB = 4
+
+# Set in each worker by _init_worker
+_board = None
+
+
+def _init_worker(grid, renderer, memory_name, shape, shared_background):
+    """Receive the board once per worker, not once per band, and attach the shared image."""
+    global _board
+    if hasattr(renderer, "sprites"):
+        get_atlas(renderer.sprites)
+    memory = shared_memory.SharedMemory(name=memory_name)
+    pixels = np.ndarray(shape, dtype=np.uint8, buffer=memory.buf)
+    _board = (grid, renderer, grid.edge_index(), memory, pixels, shared_background)
+
+
+def _render_band(top, bottom):
+    """Draw pixel rows top..bottom of the board into the shared image."""
+    grid, renderer, edges, memory, pixels, shared_background = _board
+    background = Image.fromarray(pixels[top:bottom]) if shared_background else None
+    image = renderer.render_region(grid, (0, top, pixels.shape[1], bottom), edges, image=background)
+    pixels[top:bottom] = np.asarray(image)
+
+
+def render_parallel(grid : Grid, renderer, jobs=None, band_rows=None) -> Image.Image:
+    """Same image as renderer.render(grid), drawn by jobs processes, one band of cell rows at a time.
+
+    Every band is written in place into one shared memory image. A resized background is made
+    once for the whole board and shared, resampled band by band it could be one level off.
+    """
+    jobs = jobs or os.cpu_count()
+    size = renderer.IMAGE_CELL_SIZE
+    width = grid.width * size
+    height = grid.height * size
+    if band_rows is None:
+        band_rows = max(1, math.ceil(grid.height / (jobs * BANDS_PER_JOB)))
+
+    shape = (height, width, 3)
+    memory = shared_memory.SharedMemory(create=True, size=math.prod(shape))
+    try:
+        pixels = np.ndarray(shape, dtype=np.uint8, buffer=memory.buf)
+        shared_background = getattr(renderer, "BACKGROUND_MODE", None) == "resize"
+        if shared_background:
+            pixels[:] = np.asarray(renderer.new_image(width, height))
+
+        bands = [(top * size, min(grid.height, top + band_rows) * size) for top in range(0, grid.height, band_rows)]
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(grid, renderer, memory.name, shape, shared_background)) as pool:
+            #list() raises the first error of a band
+            list(pool.map(_render_band, *zip(*bands)))
+
+        image = Image.fromarray(pixels)
+        del pixels
+    finally:
+        memory.close()
+        memory.unlink()
+    return image
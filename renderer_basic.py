@@ -1,6 +1,56 @@
+import io
+import os
 
 from PIL import Image, ImageDraw
-from grid import Grid
+from grid import Grid, EdgeIndex, EDGE_WALL, EDGE_WARP, EDGE_START
+from lru import LRUCache
+from stats import NO_STATS
+
+# Static layers (background + all edges as doors) of the last board sizes rendered
+_base_layers = LRUCache(max_size=8)
+# Bigger boards are not worth keeping in memory
+BASE_LAYER_CACHE_MAX_PIXELS = 16_000_000
+# Encoded formats by file extension, see BasicRenderer.encode
+IMAGE_FORMATS = {"png": "png", "webp": "webp", "jpg": "jpeg", "jpeg": "jpeg"}
+# Settings changing the encoded file but not the pixels
+ENCODING_SETTINGS = {"IMAGE_FORMAT", "PNG_COMPRESS_LEVEL", "PNG_COLORS", "JPEG_QUALITY", "WEBP_QUALITY", "WEBP_LOSSLESS"}
+
+class ShiftedDraw:
+    """ImageDraw stand-in taking board coordinates, for an image covering only part of the board."""
+
+    # ImageDraw methods taking their coordinates first, the other attributes are passed as they are
+    SHIFTED_METHODS = {"arc", "chord", "ellipse", "line", "multiline_text", "pieslice", "point", "polygon",
+                       "rectangle", "rounded_rectangle", "text"}
+
+    def __init__(self, draw, left, top):
+        self.draw = draw
+        self.left = left
+        self.top = top
+
+    def shift(self, xy):
+        #[(x, y), (x, y)] or [x0, y0, x1, y1]
+        if isinstance(xy[0], (tuple, list)):
+            return [(x - self.left, y - self.top) for x, y in xy]
+        return [value - (self.left if i % 2 == 0 else self.top) for i, value in enumerate(xy)]
+
+    def __getattr__(self, name):
+        method = getattr(self.draw, name)
+        if name not in self.SHIFTED_METHODS:
+            return method
+        return lambda xy, *args, **kwargs: method(self.shift(xy), *args, **kwargs)
+
+
+class ShiftedImage:
+    """Image stand-in for paste() at board coordinates, see ShiftedDraw. paste() is all the renderers use."""
+
+    def __init__(self, image, left, top):
+        self.image = image
+        self.left = left
+        self.top = top
+
+    def paste(self, im, box, mask=None):
+        self.image.paste(im, (box[0] - self.left, box[1] - self.top), mask)
+
 
 class BasicRenderer:
     def __init__(self):
@@ -10,6 +60,23 @@ class BasicRenderer:
         self.IMAGE_WALL_COLOR = "black"
         self.IMAGE_DOOR_COLOR = "lightgray"
         self.IMAGE_WARP_COLOR = "red"
+        self.LINE_WIDTH = 2
+        # Warps and starts drawn over the cell contents (else under them)
+        self.WARPS_ON_TOP = False
+        # Timers and counters of the renders, see stats.Stats
+        self.stats = NO_STATS
+        # (grid, settings, image, edges) of the last render_incremental()
+        self.previous_render = None
+        # Encoding of to_bytes/write (to_image goes by the file extension): "png", "webp" or "jpeg"
+        self.IMAGE_FORMAT = "png"
+        # PNG zlib level, 0 (fastest, biggest) to 9 (slowest, smallest)
+        self.PNG_COMPRESS_LEVEL = 6
+        # PNG palette of at most this many colors, much smaller files, 0 keeps true color
+        self.PNG_COLORS = 0
+        # Lossy qualities, 1 to 100, or WebP lossless
+        self.JPEG_QUALITY = 90
+        self.WEBP_QUALITY = 80
+        self.WEBP_LOSSLESS = False
 
     def draw_wall(self, draw, x1, y1, x2, y2, is_wall, wall_color, door_color, width=2):
         if is_wall:
@@ -19,94 +86,306 @@ class BasicRenderer:
             draw.line([(x1 + 2 * abs(x2 - x1) // 3, y1 + 2 * abs(y2 - y1) // 3), (x2, y2)], fill=door_color, width=width)
 
 
+    def wall_width(self):
+        return self.LINE_WIDTH
+
+
     def to_image(self, g : Grid, filename="grid.png", show=False):
-        # Placeholder for image generation logic
-        LINE_WIDTH = 2
-
-        image = Image.new("RGB", (g.width * self.IMAGE_CELL_SIZE, g.height * self.IMAGE_CELL_SIZE), self.IMAGE_BG_COLOR)
-        draw = ImageDraw.Draw(image)
-        for y in range(g.height):
-            for x in range(g.width):
-                cell = g.get_cell(x, y)
-                # Draw the cell contents (walls, traps, treasures, monsters)
-                for direction, has_wall in cell.walls.items():
-                    #is a wall if this cell has a wall in this direction OR the adjacent cell has a wall in the opposite direction
-                    is_wall = has_wall
-                    if not has_wall:
-                        if direction == 'N' and y > 0:
-                            is_wall = g.get_cell(x, y - 1).walls['S']
-                        elif direction == 'S' and y < g.height - 1:
-                            is_wall = g.get_cell(x, y + 1).walls['N']
-                        elif direction == 'E' and x < g.width - 1:
-                            is_wall = g.get_cell(x + 1, y).walls['W']
-                        elif direction == 'W' and x > 0:
-                            is_wall = g.get_cell(x - 1, y).walls['E']
-
-                    #draw wall or door
-                    if direction == 'N':
-                        self.draw_wall(draw, x * self.IMAGE_CELL_SIZE, y * self.IMAGE_CELL_SIZE, (x + 1) * self.IMAGE_CELL_SIZE, y * self.IMAGE_CELL_SIZE, is_wall, self.IMAGE_WALL_COLOR, self.IMAGE_DOOR_COLOR)
-                    elif direction == 'S':
-                        self.draw_wall(draw, x * self.IMAGE_CELL_SIZE, (y + 1) * self.IMAGE_CELL_SIZE, (x + 1) * self.IMAGE_CELL_SIZE, (y + 1) * self.IMAGE_CELL_SIZE, is_wall, self.IMAGE_WALL_COLOR, self.IMAGE_DOOR_COLOR)
-                    elif direction == 'E':
-                        self.draw_wall(draw, (x + 1) * self.IMAGE_CELL_SIZE, y * self.IMAGE_CELL_SIZE, (x + 1) * self.IMAGE_CELL_SIZE, (y + 1) * self.IMAGE_CELL_SIZE, is_wall, self.IMAGE_WALL_COLOR, self.IMAGE_DOOR_COLOR)
-                    elif direction == 'W':
-                        self.draw_wall(draw, x * self.IMAGE_CELL_SIZE, y * self.IMAGE_CELL_SIZE, x * self.IMAGE_CELL_SIZE, (y + 1) * self.IMAGE_CELL_SIZE, is_wall, self.IMAGE_WALL_COLOR, self.IMAGE_DOOR_COLOR)
-
-                # Warp? Red wall
-                if cell.is_warp_cell or cell.is_starting_cell:
-                    #never draw on TOP wall
-
-                    #bottom line
-                    if cell.is_starting_cell and y == g.height - 1:
-                        self.draw_wall(draw, x * self.IMAGE_CELL_SIZE, (y + 1) * self.IMAGE_CELL_SIZE - LINE_WIDTH, (x + 1) * self.IMAGE_CELL_SIZE, (y + 1) * self.IMAGE_CELL_SIZE - LINE_WIDTH, True, self.IMAGE_WARP_COLOR, self.IMAGE_WARP_COLOR)
-                    
-                    #right side
-                    if cell.is_warp_cell and x == g.width - 1:
-                        self.draw_wall(draw, (x + 1) * self.IMAGE_CELL_SIZE - LINE_WIDTH, y * self.IMAGE_CELL_SIZE, (x + 1) * self.IMAGE_CELL_SIZE - LINE_WIDTH, (y + 1) * self.IMAGE_CELL_SIZE, True, self.IMAGE_WARP_COLOR, self.IMAGE_WARP_COLOR)
-                    
-                    #left side
-                    if cell.is_warp_cell and x == 0:
-                        self.draw_wall(draw, x * self.IMAGE_CELL_SIZE + LINE_WIDTH, y * self.IMAGE_CELL_SIZE, x * self.IMAGE_CELL_SIZE + LINE_WIDTH, (y + 1) * self.IMAGE_CELL_SIZE, True, self.IMAGE_WARP_COLOR, self.IMAGE_WARP_COLOR)
-
-
-                # Trap? Red dot in bottom left corner
-                if cell.traps:
-                    dot_radius = 5
-                    for trap in cell.traps:
-                        trap_position = (x * self.IMAGE_CELL_SIZE + dot_radius * 2, y * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - dot_radius * 2)
-                        draw.ellipse([trap_position[0] - dot_radius, trap_position[1] - dot_radius, trap_position[0] + dot_radius, trap_position[1] + dot_radius], fill="red")
-
-                # Monster? Blue dot in top left corner
-                if cell.monsters:
-                    dot_radius = 5
-                    for monster in cell.monsters:
-                        monster_position = (x * self.IMAGE_CELL_SIZE + dot_radius * 2, y * self.IMAGE_CELL_SIZE + dot_radius * 2)
-                        draw.ellipse([monster_position[0] - dot_radius, monster_position[1] - dot_radius, monster_position[0] + dot_radius, monster_position[1] + dot_radius], fill="blue")
-                    # Monster's nemesis classes could be indicated with letter
-                    offset = 0
-                    for nemesis in monster.nemesis_classes:
-                        hero_class, level = nemesis
-                        text_position = (x * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - 15 - offset, y * self.IMAGE_CELL_SIZE  + 10)
-                        draw.text(text_position, hero_class.name[0] + str(level), fill="black")
-                        offset += 15
-                # Treasure? Gold dot in bottom right corner
-                if cell.treasures:
-                    dot_radius = 5
-                    for treasure in cell.treasures:
-                        treasure_position = (x * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - dot_radius * 2, y * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - dot_radius * 2)
-                        draw.ellipse([treasure_position[0] - dot_radius, treasure_position[1] - dot_radius, treasure_position[0] + dot_radius, treasure_position[1] + dot_radius], fill="gold")
-
-
-                #Boss? Large red square in center with boss ID number in middle
-                if cell.boss_id != 0:
-                    square_size = self.IMAGE_CELL_SIZE // 2
-                    top_left = (x * self.IMAGE_CELL_SIZE + (self.IMAGE_CELL_SIZE - square_size) // 2, y * self.IMAGE_CELL_SIZE + (self.IMAGE_CELL_SIZE - square_size) // 2)
-                    bottom_right = (top_left[0] + square_size, top_left[1] + square_size)
-                    draw.rectangle([top_left, bottom_right], fill="red")
-                    text_position = (top_left[0] + square_size // 4, top_left[1] + square_size // 4)
-                    draw.text(text_position, str(cell.boss_id), fill="black")
-
-
-        image.save(filename)
+        image = self.render_image(g)
+        self.save(image, filename)
         if show:
-            image.show()            
\ No newline at end of file
+            image.show()
+
+
+    def save(self, image : Image.Image, filename):
+        """Write a rendered image to filename, in the format of its extension (IMAGE_FORMAT if none)."""
+        extension = os.path.splitext(filename)[1][1:].lower()
+        if extension and extension not in IMAGE_FORMATS:
+            #any other format Pillow knows from the extension (bmp, gif, tiff...), with its defaults
+            with self.stats.phase("encode"):
+                image.save(filename)
+        else:
+            self.encode(image, filename, IMAGE_FORMATS.get(extension))
+        self.stats.count("bytes_written", os.path.getsize(filename))
+
+
+    def to_bytes(self, g : Grid, format=None) -> bytes:
+        """The board encoded in memory as format (IMAGE_FORMAT if None), nothing written to disk."""
+        buffer = io.BytesIO()
+        self.write(g, buffer, format)
+        return buffer.getvalue()
+
+
+    def write(self, g : Grid, file, format=None):
+        """Encode the board into file, any binary file object (socket file, BytesIO...)."""
+        self.encode(self.render_image(g), file, format)
+
+
+    def to_pixels(self, g : Grid):
+        """The board as a (height, width, channels) uint8 NumPy array, never encoded."""
+        import numpy as np
+        return np.asarray(self.render_image(g))
+
+
+    def render_image(self, g : Grid) -> Image.Image:
+        #grids tracking their changes are being edited: only draw the changes again
+        return self.render_incremental(g) if g.dirty is not None else self.render(g)
+
+
+    def encode(self, image : Image.Image, file, format=None):
+        """Save image to file (file name or binary file object) as format, IMAGE_FORMAT if None."""
+        format = format or self.IMAGE_FORMAT
+        with self.stats.phase("encode"):
+            if format == "png":
+                if self.PNG_COLORS:
+                    #octree is the only quantizer taking RGBA, median cut looks better on RGB
+                    method = Image.Quantize.FASTOCTREE if image.mode == "RGBA" else Image.Quantize.MEDIANCUT
+                    image = image.quantize(self.PNG_COLORS, method=method)
+                image.save(file, "PNG", compress_level=self.PNG_COMPRESS_LEVEL)
+            elif format == "webp":
+                image.save(file, "WEBP", quality=self.WEBP_QUALITY, lossless=self.WEBP_LOSSLESS)
+            elif format == "jpeg":
+                if image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                image.save(file, "JPEG", quality=self.JPEG_QUALITY)
+            else:
+                raise ValueError(f"Unknown image format {format}, use one of png, webp, jpeg")
+
+
+    def to_image_tiled(self, g : Grid, filename="grid.png", band_rows=4):
+        """Render and write the board as PNG one band of band_rows cell rows at a time.
+
+        Peak memory depends on the band size, not on the board size.
+        """
+        from png_stream import PNGStreamWriter
+
+        if not filename.lower().endswith(".png"):
+            raise ValueError(f"Band by band rendering only writes PNG, not {filename}")
+
+        size = self.IMAGE_CELL_SIZE
+        width = g.width * size
+        edges = g.edge_index()
+        with open(filename, "wb") as f:
+            writer = PNGStreamWriter(f, width, g.height * size, compress_level=self.PNG_COMPRESS_LEVEL)
+            for top in range(0, g.height, band_rows):
+                bottom = min(g.height, top + band_rows)
+                band = self.render_region(g, (0, top * size, width, bottom * size), edges)
+                with self.stats.phase("encode"):
+                    writer.write_band(band)
+            writer.close()
+            self.stats.count("bytes_written", f.tell())
+
+
+    def render(self, g : Grid) -> Image.Image:
+        """Draw the grid and return the image, without saving it."""
+        stats = self.stats
+        with stats.phase("sprite_loading"):
+            self.load_sprites()
+        with stats.phase("background"):
+            image = self.base_layer(g.width, g.height).copy()
+        with stats.phase("edge_index"):
+            edges = g.edge_index()
+        # Doors are already in the base layer
+        self.draw_board(image, ImageDraw.Draw(image), g, edges, doors=False)
+        return image
+
+
+    def render_incremental(self, g : Grid) -> Image.Image:
+        """Same image as render(), drawing again only the cells changed since the previous call.
+
+        The first call renders the whole board and starts tracking the changes of the grid for
+        this renderer (Grid.track_changes), other renderers keep their own. The image returned is
+        updated in place by the next calls: copy it to keep it as it is.
+        """
+        settings = self.settings_key()
+        previous = self.previous_render
+        if previous is None or previous[0] is not g or previous[1] != settings or not g.is_tracked(self):
+            image = self.render(g)
+            with self.stats.phase("edge_index"):
+                edges = g.edge_index()
+            g.track_changes(self)
+            self.previous_render = (g, settings, image, edges)
+            return image
+
+        _, _, image, edges = previous
+        dirty = g.take_dirty(self)
+        if not dirty:
+            return image
+        with self.stats.phase("edge_index"):
+            g.update_edge_index(edges, dirty)
+        size = self.IMAGE_CELL_SIZE
+        #lines and sprites of a cell spill a little over its neighbours
+        margin = size // 4
+        #the cached base layer has the exact background, a resampled piece could be one level off
+        base = _base_layers.get((type(self).__name__, g.width, g.height, settings))
+        for x, y in dirty:
+            box = (
+                max(0, x * size - margin),
+                max(0, y * size - margin),
+                min(image.size[0], (x + 1) * size + margin),
+                min(image.size[1], (y + 1) * size + margin),
+            )
+            background = base.crop(box) if base is not None else None
+            image.paste(self.render_region(g, box, edges, image=background), box[:2])
+        self.stats.count("cells_redrawn", len(dirty))
+        return image
+
+
+    def render_region(self, g : Grid, box, edges : EdgeIndex = None, image : Image.Image = None) -> Image.Image:
+        """Only the (left, top, right, bottom) pixel box of the board, same pixels as render() there.
+
+        Lines and sprites straddling the box border come from cells around it: one more cell is
+        drawn on each side and clipped. The board is drawn on image when given (the background of
+        the box, cut from the full board background), else on a new background.
+        """
+        left, top, right, bottom = box
+        size = self.IMAGE_CELL_SIZE
+        if edges is None:
+            with self.stats.phase("edge_index"):
+                edges = g.edge_index()
+        cells = (
+            max(0, left // size - 1),
+            max(0, top // size - 1),
+            min(g.width, -(-right // size) + 1),
+            min(g.height, -(-bottom // size) + 1),
+        )
+        if image is None:
+            with self.stats.phase("background"):
+                image = self.new_region_image(box, g.width * size, g.height * size)
+        self.draw_board(ShiftedImage(image, left, top), ShiftedDraw(ImageDraw.Draw(image), left, top), g, edges, cells=cells)
+        return image
+
+
+    def draw_board(self, image, draw, g : Grid, edges : EdgeIndex, cells=None, doors=True):
+        """Walls (and doors), warps and cell contents, of the (x0, y0, x1, y1) cells or of all of them.
+
+        With cells, warps and starts are only drawn along the sides of those cells on the board border.
+        """
+        stats = self.stats
+        # Each wall is drawn once, for both cells it separates
+        with stats.phase("walls"):
+            self.draw_edges(draw, edges, doors=doors, cells=cells)
+        if not self.WARPS_ON_TOP:
+            with stats.phase("warps"):
+                self.draw_warps_and_starts(image, draw, edges, cells=cells)
+
+        x0, y0, x1, y1 = cells if cells is not None else (0, 0, g.width, g.height)
+        with stats.phase("cells"):
+            for y in range(y0, y1):
+                for x in range(x0, x1):
+                    self.draw_cell(image, draw, x, y, g.get_cell(x, y))
+
+        if self.WARPS_ON_TOP:
+            with stats.phase("warps"):
+                self.draw_warps_and_starts(image, draw, edges, cells=cells)
+
+
+    def load_sprites(self):
+        """Decode what the renders need before the first one, nothing here."""
+        pass
+
+
+    def new_image(self, width, height) -> Image.Image:
+        """Empty image (background only) of width x height pixels."""
+        return self.new_region_image((0, 0, width, height), width, height)
+
+
+    def new_region_image(self, box, board_width, board_height) -> Image.Image:
+        """Background of the (left, top, right, bottom) pixel box of a board_width x board_height board."""
+        return Image.new("RGB", (box[2] - box[0], box[3] - box[1]), self.IMAGE_BG_COLOR)
+
+
+    def settings_key(self):
+        """Everything that changes the pixels, comparable: uppercase settings and sprites."""
+        settings = tuple(sorted((name, repr(value)) for name, value in vars(self).items() if name.isupper() and name not in ENCODING_SETTINGS))
+        return (settings, repr(getattr(self, "sprites", None)))
+
+
+    def base_layer(self, width, height) -> Image.Image:
+        """Background with every edge drawn as a door, the same for all boards of this size.
+
+        Cached: copy it before drawing on it.
+        """
+        key = (type(self).__name__, width, height, self.settings_key())
+        image = _base_layers.get(key)
+        if image is None:
+            image = self.new_image(width * self.IMAGE_CELL_SIZE, height * self.IMAGE_CELL_SIZE)
+            #walls are drawn over doors with the same line, so a wall fully covers its door
+            self.draw_edges(ImageDraw.Draw(image), EdgeIndex(width, height), walls=False)
+            if image.size[0] * image.size[1] <= BASE_LAYER_CACHE_MAX_PIXELS:
+                _base_layers.put(key, image)
+        return image
+
+
+    def draw_edges(self, draw, edges : EdgeIndex, doors=True, walls=True, cells=None):
+        """Doors first then walls, so walls always win where lines meet."""
+        size = self.IMAGE_CELL_SIZE
+        width = self.wall_width()
+        for is_wall in (False, True):
+            if not (walls if is_wall else doors):
+                continue
+            for x1, y1, x2, y2, value in edges.edges(cells):
+                if bool(value & EDGE_WALL) == is_wall:
+                    self.draw_wall(draw, x1 * size, y1 * size, x2 * size, y2 * size, is_wall, self.IMAGE_WALL_COLOR, self.IMAGE_DOOR_COLOR, width=width)
+
+
+    def draw_warps_and_starts(self, image, draw, edges : EdgeIndex, cells=None):
+        """Red line along the warps and starts, never on the top border. cells as in draw_board."""
+        size = self.IMAGE_CELL_SIZE
+        x0, y0, x1, y1 = cells if cells is not None else (0, 0, edges.width, edges.height)
+        #bottom line
+        y = edges.height
+        if y1 == y:
+            for x in range(x0, x1):
+                if edges.horizontal[y][x] & EDGE_START:
+                    self.draw_wall(draw, x * size, y * size - self.LINE_WIDTH, (x + 1) * size, y * size - self.LINE_WIDTH, True, self.IMAGE_WARP_COLOR, self.IMAGE_WARP_COLOR)
+
+        for y in range(y0, y1):
+            row = edges.vertical[y]
+            #left side
+            if x0 == 0 and row[0] & EDGE_WARP:
+                self.draw_wall(draw, self.LINE_WIDTH, y * size, self.LINE_WIDTH, (y + 1) * size, True, self.IMAGE_WARP_COLOR, self.IMAGE_WARP_COLOR)
+            #right side
+            x = edges.width
+            if x1 == x and row[x] & EDGE_WARP:
+                self.draw_wall(draw, x * size - self.LINE_WIDTH, y * size, x * size - self.LINE_WIDTH, (y + 1) * size, True, self.IMAGE_WARP_COLOR, self.IMAGE_WARP_COLOR)
+
+
+    def draw_cell(self, image, draw, x, y, cell):
+        """Draw the cell contents (traps, treasures, monsters, boss)."""
+        # Trap? Red dot in bottom left corner
+        if cell.traps:
+            dot_radius = 5
+            for trap in cell.traps:
+                trap_position = (x * self.IMAGE_CELL_SIZE + dot_radius * 2, y * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - dot_radius * 2)
+                draw.ellipse([trap_position[0] - dot_radius, trap_position[1] - dot_radius, trap_position[0] + dot_radius, trap_position[1] + dot_radius], fill="red")
+
+        # Monster? Blue dot in top left corner
+        if cell.monsters:
+            dot_radius = 5
+            for monster in cell.monsters:
+                monster_position = (x * self.IMAGE_CELL_SIZE + dot_radius * 2, y * self.IMAGE_CELL_SIZE + dot_radius * 2)
+                draw.ellipse([monster_position[0] - dot_radius, monster_position[1] - dot_radius, monster_position[0] + dot_radius, monster_position[1] + dot_radius], fill="blue")
+            # Monster's nemesis classes could be indicated with letter
+            offset = 0
+            for nemesis in monster.nemesis_classes:
+                hero_class, level = nemesis
+                text_position = (x * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - 15 - offset, y * self.IMAGE_CELL_SIZE  + 10)
+                draw.text(text_position, hero_class.name[0] + str(level), fill="black")
+                offset += 15
+        # Treasure? Gold dot in bottom right corner
+        if cell.treasures:
+            dot_radius = 5
+            for treasure in cell.treasures:
+                treasure_position = (x * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - dot_radius * 2, y * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - dot_radius * 2)
+                draw.ellipse([treasure_position[0] - dot_radius, treasure_position[1] - dot_radius, treasure_position[0] + dot_radius, treasure_position[1] + dot_radius], fill="gold")
+
+
+        #Boss? Large red square in center with boss ID number in middle
+        if cell.boss_id != 0:
+            square_size = self.IMAGE_CELL_SIZE // 2
+            top_left = (x * self.IMAGE_CELL_SIZE + (self.IMAGE_CELL_SIZE - square_size) // 2, y * self.IMAGE_CELL_SIZE + (self.IMAGE_CELL_SIZE - square_size) // 2)
+            bottom_right = (top_left[0] + square_size, top_left[1] + square_size)
+            draw.rectangle([top_left, bottom_right], fill="red")
+            text_position = (top_left[0] + square_size // 4, top_left[1] + square_size // 4)
+            draw.text(text_position, str(cell.boss_id), fill="black")
@@ -1,7 +1,8 @@
 
-from PIL import Image, ImageDraw
-from grid import Grid
+from PIL import Image
+from grid import EdgeIndex, EDGE_START, EDGE_WARP
 from renderer_basic import BasicRenderer
+from sprite_atlas import get_atlas
 
 class SpritesRenderer(BasicRenderer):
     sprites = {
@@ -36,130 +37,149 @@ class SpritesRenderer(BasicRenderer):
         #Add some new settings
         self.SPRITES_PADDING = 4
         self.WALL_WIDTH = 4
-
-
-    def to_image(self, g : Grid, filename="grid.png", show=False):
-
-        image = Image.new("RGB", (g.width * self.IMAGE_CELL_SIZE, g.height * self.IMAGE_CELL_SIZE), self.IMAGE_BG_COLOR)
-        draw = ImageDraw.Draw(image)
-
-        background = Image.open(self.sprites["bg"])
-        image.paste(background, (0, 0))
-
-        for y in range(g.height):
-            for x in range(g.width):
-                cell = g.get_cell(x, y)
-                # Draw the cell contents (walls, traps, treasures, monsters)
-                for direction, has_wall in cell.walls.items():
-                    #is a wall if this cell has a wall in this direction OR the adjacent cell has a wall in the opposite direction
-                    is_wall = has_wall
-                    if not has_wall:
-                        if direction == 'N' and y > 0:
-                            is_wall = g.get_cell(x, y - 1).walls['S']
-                        elif direction == 'S' and y < g.height - 1:
-                            is_wall = g.get_cell(x, y + 1).walls['N']
-                        elif direction == 'E' and x < g.width - 1:
-                            is_wall = g.get_cell(x + 1, y).walls['W']
-                        elif direction == 'W' and x > 0:
-                            is_wall = g.get_cell(x - 1, y).walls['E']
-
-                    #draw wall or door
-                    if direction == 'N':
-                        self.draw_wall(draw, x * self.IMAGE_CELL_SIZE, y * self.IMAGE_CELL_SIZE, (x + 1) * self.IMAGE_CELL_SIZE, y * self.IMAGE_CELL_SIZE, is_wall, self.IMAGE_WALL_COLOR, self.IMAGE_DOOR_COLOR, width=self.WALL_WIDTH)
-                    elif direction == 'S':
-                        self.draw_wall(draw, x * self.IMAGE_CELL_SIZE, (y + 1) * self.IMAGE_CELL_SIZE, (x + 1) * self.IMAGE_CELL_SIZE, (y + 1) * self.IMAGE_CELL_SIZE, is_wall, self.IMAGE_WALL_COLOR, self.IMAGE_DOOR_COLOR, width=self.WALL_WIDTH)
-                    elif direction == 'E':
-                        self.draw_wall(draw, (x + 1) * self.IMAGE_CELL_SIZE, y * self.IMAGE_CELL_SIZE, (x + 1) * self.IMAGE_CELL_SIZE, (y + 1) * self.IMAGE_CELL_SIZE, is_wall, self.IMAGE_WALL_COLOR, self.IMAGE_DOOR_COLOR, width=self.WALL_WIDTH)
-                    elif direction == 'W':
-                        self.draw_wall(draw, x * self.IMAGE_CELL_SIZE, y * self.IMAGE_CELL_SIZE, x * self.IMAGE_CELL_SIZE, (y + 1) * self.IMAGE_CELL_SIZE, is_wall, self.IMAGE_WALL_COLOR, self.IMAGE_DOOR_COLOR, width=self.WALL_WIDTH)
-
-                # Trap? Red dot in bottom left corner
-                if cell.traps and len(cell.traps) > 0:
-                    sprite = Image.open(self.sprites["trap"])
-                    trap_position = (x * self.IMAGE_CELL_SIZE + self.SPRITES_PADDING, y * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - self.SPRITES_PADDING - sprite.size[1])
-                    image.paste(sprite, trap_position, sprite)
-
-                # Monster? Blue dot in top left corner
-                if cell.monsters:
-                    offset = 0
-                    for monster in cell.monsters:
-                        sprite = Image.open(self.sprites[monster.name.lower()]) 
-
-                        monster_position = (x * self.IMAGE_CELL_SIZE + self.SPRITES_PADDING + offset, y * self.IMAGE_CELL_SIZE + self.SPRITES_PADDING)
-                        image.paste(sprite, monster_position, sprite)
-                        # Monsters overlap a bit if multiple
-                        offset += sprite.size[0] // 2
-
-                    # Monster's nemesis classes could be indicated with letter
-                    offset = 0
-                    for nemesis in monster.nemesis_classes:
-                        hero_class, level = nemesis
-
-                        sprite = Image.open(self.sprites[hero_class.name.lower()]) 
-                        nemesis_position = (x * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - self.SPRITES_PADDING - sprite.size[0] - offset, y * self.IMAGE_CELL_SIZE + self.SPRITES_PADDING)
-                        image.paste(sprite, nemesis_position, sprite)
-                        # Draw level next to nemesis sprite
-                        text_position = (x * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - self.SPRITES_PADDING - offset - 6, y * self.IMAGE_CELL_SIZE + self.SPRITES_PADDING + sprite.size[1] - 12)
-                        draw.text(text_position, str(level), fill="black")
-                        # Nemesis indicators side by side (no overlap)
-                        offset += sprite.size[0]
-
-                # Treasure? Gold dot in bottom right corner
-                if cell.treasures:
-                    offset = 0
-                    for treasure in cell.treasures:
-                        sprite = Image.open(self.sprites[treasure.treasure_type.name.lower()])
-                        treasure_position = (x * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - self.SPRITES_PADDING - sprite.size[0] - offset, y * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - self.SPRITES_PADDING - sprite.size[1])
-                        image.paste(sprite, treasure_position, sprite)
-                        # Treasures overlap a bit if multiple
-                        offset += sprite.size[0] // 2
-
-
-                #Boss? Large red square in center with boss ID number in middle
-                if cell.boss_id != 0:
-                    sprite = Image.open(self.sprites["boss"])
-
-                    offset = self.IMAGE_CELL_SIZE // 2 - sprite.size[0] // 2
-                    top_left = (x * self.IMAGE_CELL_SIZE + offset, y * self.IMAGE_CELL_SIZE + offset)
-                    bottom_right = (top_left[0] + sprite.size[0], top_left[1] + sprite.size[1])
-                    draw.rectangle([top_left, bottom_right], fill="red")
-
-                    image.paste(sprite, top_left, sprite)
-
-                    offset = self.IMAGE_CELL_SIZE // 2 - 6
-                    text_position = (x * self.IMAGE_CELL_SIZE + offset + 3, y * self.IMAGE_CELL_SIZE + offset + 5)
-                    draw.text(text_position, str(cell.boss_id), fill="black")
-
-
-                # Warp? 
-                if cell.is_warp_cell or cell.is_starting_cell:
-                    #never draw on TOP wall
-                    gate = Image.open(self.sprites["gate"])
-
-                    #bottom line
-                    if cell.is_starting_cell and y == g.height - 1:
-                        offset_x = (self.IMAGE_CELL_SIZE - gate.size[0]) // 2
-                        offset_y = gate.size[1]
-                        top_left = (x * self.IMAGE_CELL_SIZE + offset_x, (y+1) * self.IMAGE_CELL_SIZE - offset_y)
-                        image.paste(gate, top_left, gate)
-                    
-                    #right side
-                    if cell.is_warp_cell and x == g.width - 1:
-                        gate = gate.rotate(90, expand=False)
-                        offset_x = gate.size[0]
-                        offset_y = (self.IMAGE_CELL_SIZE - gate.size[1]) // 2
-                        top_left = ((x+1) * self.IMAGE_CELL_SIZE - offset_x, y * self.IMAGE_CELL_SIZE + offset_y)
-                        image.paste(gate, top_left, gate)
-
-                    
-                    #left side
-                    if cell.is_warp_cell and x == 0:
-                        gate = gate.rotate(270, expand=False)
-                        offset_y = (self.IMAGE_CELL_SIZE - gate.size[1]) // 2
-                        top_left = (0, y * self.IMAGE_CELL_SIZE + offset_y)
-                        image.paste(gate, top_left, gate)
- 
-
-        image.save(filename)
-        if show:
-            image.show()            
\ No newline at end of file
+        self.WARPS_ON_TOP = True
+        # "crop": background at its own size, cut to the board, "resize": stretched to the board
+        self.BACKGROUND_MODE = "crop"
+        # Sprites are drawn for cells of this size, bigger cells get them scaled up
+        self.SPRITES_BASE_CELL_SIZE = 100
+
+
+    def sprite(self, name, rotation=0):
+        """Get a decoded sprite from the shared atlas, scaled for the current cell size.
+
+        The background is a photo, not pixel art: it always comes at its own size.
+        """
+        if name == "bg":
+            return get_atlas(self.sprites).get(name, rotation=rotation)
+        scale = max(1, self.IMAGE_CELL_SIZE // self.SPRITES_BASE_CELL_SIZE)
+        self.stats.count("sprites_pasted")
+        return get_atlas(self.sprites).get(name, scale=scale, rotation=rotation)
+
+
+    def load_sprites(self):
+        get_atlas(self.sprites)
+
+
+    def wall_width(self):
+        return self.WALL_WIDTH
+
+
+    def new_region_image(self, box, board_width, board_height) -> Image.Image:
+        image = super().new_region_image(box, board_width, board_height)
+        left, top, right, bottom = box
+        if self.BACKGROUND_MODE == "resize":
+            image.paste(self.resized_background(box, board_width, board_height), (0, 0))
+        else:
+            image.paste(self.sprite("bg"), (-left, -top))
+        return image
+
+
+    def resized_background(self, box, board_width, board_height) -> Image.Image:
+        """The box part of the background stretched to board_width x board_height.
+
+        Resampling only the box can round a few pixels one level away from resampling it all.
+        """
+        left, top, right, bottom = box
+        background = self.sprite("bg")
+        if board_width * 2 <= background.size[0] and board_height * 2 <= background.size[1]:
+            with Image.open(self.sprites["bg"]) as source:
+                #JPEG can be decoded straight at 1/2, 1/4 or 1/8 of its size when the board is smaller
+                source.draft("RGB", (board_width, board_height))
+                background = source.convert("RGB")
+        scale_x = background.size[0] / board_width
+        scale_y = background.size[1] / board_height
+        source_box = (left * scale_x, top * scale_y, right * scale_x, bottom * scale_y)
+        return background.resize((right - left, bottom - top), Image.BILINEAR, box=source_box)
+
+
+    def draw_cell(self, image, draw, x, y, cell):
+        """Draw the cell contents (traps, treasures, monsters, boss) with sprites."""
+        # Trap? Red dot in bottom left corner
+        if cell.traps and len(cell.traps) > 0:
+            sprite = self.sprite("trap")
+            trap_position = (x * self.IMAGE_CELL_SIZE + self.SPRITES_PADDING, y * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - self.SPRITES_PADDING - sprite.size[1])
+            image.paste(sprite, trap_position, sprite)
+
+        # Monster? Blue dot in top left corner
+        if cell.monsters:
+            offset = 0
+            for monster in cell.monsters:
+                sprite = self.sprite(monster.name.lower())
+
+                monster_position = (x * self.IMAGE_CELL_SIZE + self.SPRITES_PADDING + offset, y * self.IMAGE_CELL_SIZE + self.SPRITES_PADDING)
+                image.paste(sprite, monster_position, sprite)
+                # Monsters overlap a bit if multiple
+                offset += sprite.size[0] // 2
+
+            # Monster's nemesis classes could be indicated with letter
+            offset = 0
+            for nemesis in monster.nemesis_classes:
+                hero_class, level = nemesis
+
+                sprite = self.sprite(hero_class.name.lower())
+                nemesis_position = (x * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - self.SPRITES_PADDING - sprite.size[0] - offset, y * self.IMAGE_CELL_SIZE + self.SPRITES_PADDING)
+                image.paste(sprite, nemesis_position, sprite)
+                # Draw level next to nemesis sprite
+                text_position = (x * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - self.SPRITES_PADDING - offset - 6, y * self.IMAGE_CELL_SIZE + self.SPRITES_PADDING + sprite.size[1] - 12)
+                draw.text(text_position, str(level), fill="black")
+                # Nemesis indicators side by side (no overlap)
+                offset += sprite.size[0]
+
+        # Treasure? Gold dot in bottom right corner
+        if cell.treasures:
+            offset = 0
+            for treasure in cell.treasures:
+                sprite = self.sprite(treasure.treasure_type.name.lower())
+                treasure_position = (x * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - self.SPRITES_PADDING - sprite.size[0] - offset, y * self.IMAGE_CELL_SIZE + self.IMAGE_CELL_SIZE - self.SPRITES_PADDING - sprite.size[1])
+                image.paste(sprite, treasure_position, sprite)
+                # Treasures overlap a bit if multiple
+                offset += sprite.size[0] // 2
+
+
+        #Boss? Large red square in center with boss ID number in middle
+        if cell.boss_id != 0:
+            sprite = self.sprite("boss")
+
+            offset = self.IMAGE_CELL_SIZE // 2 - sprite.size[0] // 2
+            top_left = (x * self.IMAGE_CELL_SIZE + offset, y * self.IMAGE_CELL_SIZE + offset)
+            bottom_right = (top_left[0] + sprite.size[0], top_left[1] + sprite.size[1])
+            draw.rectangle([top_left, bottom_right], fill="red")
+
+            image.paste(sprite, top_left, sprite)
+
+            offset = self.IMAGE_CELL_SIZE // 2 - 6
+            text_position = (x * self.IMAGE_CELL_SIZE + offset + 3, y * self.IMAGE_CELL_SIZE + offset + 5)
+            draw.text(text_position, str(cell.boss_id), fill="black")
+
+
+    def draw_warps_and_starts(self, image, draw, edges : EdgeIndex, cells=None):
+        """Gate sprites on the warps and starts, never on the top border. cells as in draw_board."""
+        x0, y0, x1, y1 = cells if cells is not None else (0, 0, edges.width, edges.height)
+        #bottom line
+        y = edges.height - 1
+        if y1 == edges.height:
+            for x in range(x0, x1):
+                if edges.horizontal[edges.height][x] & EDGE_START:
+                    gate = self.sprite("gate")
+                    offset_x = (self.IMAGE_CELL_SIZE - gate.size[0]) // 2
+                    offset_y = gate.size[1]
+                    top_left = (x * self.IMAGE_CELL_SIZE + offset_x, (y+1) * self.IMAGE_CELL_SIZE - offset_y)
+                    image.paste(gate, top_left, gate)
+
+        for y in range(y0, y1):
+            row = edges.vertical[y]
+            #right side
+            x = edges.width - 1
+            if x1 == edges.width and row[edges.width] & EDGE_WARP:
+                gate = self.sprite("gate", rotation=90)
+                offset_x = gate.size[0]
+                offset_y = (self.IMAGE_CELL_SIZE - gate.size[1]) // 2
+                top_left = ((x+1) * self.IMAGE_CELL_SIZE - offset_x, y * self.IMAGE_CELL_SIZE + offset_y)
+                image.paste(gate, top_left, gate)
+
+            #left side
+            if x0 == 0 and row[0] & EDGE_WARP:
+                gate = self.sprite("gate", rotation=270)
+                offset_y = (self.IMAGE_CELL_SIZE - gate.size[1]) // 2
+                top_left = (0, y * self.IMAGE_CELL_SIZE + offset_y)
+                image.paste(gate, top_left, gate)
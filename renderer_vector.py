@@ -0,0 +1,158 @@
+import io
+import math
+import os
+
+from grid import Grid
+from renderer_sprites import SpritesRenderer
+from vector_document import SVGDocument, PDFDocument
+
+
+class VectorRenderer(SpritesRenderer):
+    """Sprites renderer drawing into a vector document: walls, doors, warps and text are paths.
+
+    The document takes the ImageDraw and Image.paste calls of the raster renderers, so the
+    drawing code is the same, only the background is placed as an image file.
+    """
+
+    DOCUMENT = None
+    EXTENSION = None
+
+    def __init__(self):
+        super().__init__()
+        # Print sheets: page size and margin in points (A4), space between boards
+        self.SHEET_PAGE_SIZE = (595, 842)
+        self.SHEET_MARGIN = 28
+        self.SHEET_GAP = 14
+
+
+    def to_image(self, g : Grid, filename=None, show=False):
+        filename = filename or f"grid.{self.EXTENSION}"
+        with open(filename, "wb") as f:
+            self.write_document(g, f)
+            self.stats.count("bytes_written", f.tell())
+
+
+    def render(self, g : Grid) -> bytes:
+        """The document of the board, a single page of the board size."""
+        buffer = io.BytesIO()
+        self.write_document(g, buffer)
+        return buffer.getvalue()
+
+
+    def to_bytes(self, g : Grid, format=None) -> bytes:
+        self.check_format(format)
+        return self.render(g)
+
+
+    def write(self, g : Grid, file, format=None):
+        self.check_format(format)
+        self.write_document(g, file)
+
+
+    def check_format(self, format):
+        if format not in (None, self.EXTENSION):
+            raise ValueError(f"The {self.EXTENSION} renderer only writes {self.EXTENSION}, not {format}")
+
+
+    def write_document(self, g : Grid, file):
+        size = self.IMAGE_CELL_SIZE
+        document = self.DOCUMENT(file, g.width * size, g.height * size)
+        document.begin_page()
+        self.draw_vector_board(document, g)
+        document.end_page()
+        document.close()
+
+
+    def draw_vector_board(self, document, g : Grid):
+        """The whole board at (0, 0), one unit per pixel of the raster renderers."""
+        width = g.width * self.IMAGE_CELL_SIZE
+        height = g.height * self.IMAGE_CELL_SIZE
+        document.begin_group(0, 0, clip=(0, 0, width, height))
+        with self.stats.phase("background"):
+            if self.BACKGROUND_MODE == "resize":
+                document.image_file(self.sprites["bg"], (0, 0, width, height))
+            else:
+                background = self.sprite("bg")
+                document.image_file(self.sprites["bg"], (0, 0, background.size[0], background.size[1]))
+        with self.stats.phase("edge_index"):
+            edges = g.edge_index()
+        self.draw_board(document, document, g, edges)
+        document.end_group(clip=True)
+
+
+    def sheet_layout(self, board_width, board_height, boards_per_page):
+        """(columns, rows, scale) fitting boards_per_page boards on a page as big as possible."""
+        page_width, page_height = self.SHEET_PAGE_SIZE
+        best = None
+        for columns in range(1, boards_per_page + 1):
+            rows = math.ceil(boards_per_page / columns)
+            slot_width = (page_width - 2 * self.SHEET_MARGIN - (columns - 1) * self.SHEET_GAP) / columns
+            slot_height = (page_height - 2 * self.SHEET_MARGIN - (rows - 1) * self.SHEET_GAP) / rows
+            scale = min(slot_width / board_width, slot_height / board_height)
+            if best is None or scale > best[2]:
+                best = (columns, rows, scale)
+        return best
+
+
+    def sheet_filename(self, filename, page):
+        """Formats without pages (SVG) get one file per page: sheets_001.svg, sheets_002.svg..."""
+        if self.DOCUMENT.MULTI_PAGE:
+            return filename
+        root, extension = os.path.splitext(filename)
+        return f"{root}_{page + 1:03d}{extension}"
+
+
+    def to_sheets(self, grids, filename=None, boards_per_page=4):
+        """Print sheets of boards_per_page boards per page, each page written as soon as it is full.
+
+        grids can be a generator making the boards one by one, all of them the same size.
+        Returns the files written.
+        """
+        filename = filename or f"sheets.{self.EXTENSION}"
+        page_width, page_height = self.SHEET_PAGE_SIZE
+        files = []
+        file = document = layout = None
+        for index, grid in enumerate(grids):
+            page, slot = divmod(index, boards_per_page)
+            board_width = grid.width * self.IMAGE_CELL_SIZE
+            board_height = grid.height * self.IMAGE_CELL_SIZE
+            if layout is None:
+                layout = self.sheet_layout(board_width, board_height, boards_per_page)
+            columns, rows, scale = layout
+
+            if slot == 0:
+                if document is not None:
+                    document.end_page()
+                if document is None or not document.MULTI_PAGE:
+                    if document is not None:
+                        document.close()
+                        self.stats.count("bytes_written", file.tell())
+                        file.close()
+                    files.append(self.sheet_filename(filename, page))
+                    file = open(files[-1], "wb")
+                    document = self.DOCUMENT(file, page_width, page_height)
+                document.begin_page()
+
+            row, column = divmod(slot, columns)
+            left = self.SHEET_MARGIN + column * ((page_width - 2 * self.SHEET_MARGIN + self.SHEET_GAP) / columns)
+            top = self.SHEET_MARGIN + row * ((page_height - 2 * self.SHEET_MARGIN + self.SHEET_GAP) / rows)
+            document.begin_group(left, top, scale)
+            self.draw_vector_board(document, grid)
+            document.end_group()
+
+        if document is not None:
+            document.end_page()
+            document.close()
+            self.stats.count("bytes_written", file.tell())
+            file.close()
+        return files
+
+
+class SVGRenderer(VectorRenderer):
+    DOCUMENT = SVGDocument
+    EXTENSION = "svg"
+
+
+class PDFRenderer(VectorRenderer):
+    DOCUMENT = PDFDocument
+    EXTENSION = "pdf"
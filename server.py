@@ -0,0 +1,152 @@
+import json
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from boards import make_grid, make_renderer, RENDERERS, GRID_SETTINGS, RENDERER_SETTINGS
+from lru import LRUCache
+from sprite_atlas import get_atlas
+
+# Biggest board served, in cells
+MAX_BOARD_SIZE = 50
+# Smallest board served, in cells: the generation places 3 bosses on different cells
+MIN_BOARD_CELLS = 3
+
+
+def _init_worker():
+    """Decode the sprites once when the worker starts, not on its first request."""
+    for renderer_type in RENDERERS:
+        renderer = make_renderer(renderer_type)
+        if hasattr(renderer, "sprites"):
+            get_atlas(renderer.sprites)
+
+
+def _make_board(kind, seed, width, height, renderer_type, grid_settings, renderer_settings):
+    """Bytes of the board: PNG, WebP or JPEG image, or JSON description."""
+    grid = make_grid(width, height, grid_settings, seed=seed)
+    grid.generate()
+    if kind == "json":
+        return json.dumps(grid.to_dict()).encode("utf-8")
+    return make_renderer(renderer_type, renderer_settings).to_bytes(grid, kind)
+
+
+class BoardService:
+    """Boards made in a process pool, answered from an LRU cache when already made.
+
+    Identical requests arriving together wait for the same job instead of making the board twice.
+    """
+
+    def __init__(self, jobs=None, cache_size=512, grid_settings=GRID_SETTINGS, renderer_settings=RENDERER_SETTINGS):
+        self.pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker)
+        self.cache = LRUCache(cache_size)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.grid_settings = grid_settings
+        self.renderer_settings = renderer_settings
+
+
+    def board(self, kind, seed, width, height, renderer_type="basic", cache=True):
+        """The board as bytes. cache=False for a one-off seed nobody asked for: it is not kept."""
+        if kind == "json":
+            renderer_type = None
+        key = (kind, seed, width, height, renderer_type)
+        with self.lock:
+            data = self.cache.get(key)
+            if data is not None:
+                return data
+            future = self.pending.get(key)
+            if future is None:
+                future = self.pool.submit(_make_board, kind, seed, width, height, renderer_type, self.grid_settings, self.renderer_settings)
+                self.pending[key] = future
+
+        try:
+            data = future.result()
+        except Exception:
+            with self.lock:
+                self.pending.pop(key, None)
+            raise
+        with self.lock:
+            if cache:
+                self.cache.put(key, data)
+            self.pending.pop(key, None)
+        return data
+
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+class BoardRequestHandler(BaseHTTPRequestHandler):
+    """GET /board.png, /board.webp, /board.jpg and /board.json with seed, width, height and renderer query parameters."""
+
+    # HTTP/1.1 keeps the connection alive between requests
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes: without this the body waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+    CONTENT_TYPES = {"png": "image/png", "webp": "image/webp", "jpeg": "image/jpeg", "json": "application/json"}
+    PATHS = {"/board.png": "png", "/board.webp": "webp", "/board.jpg": "jpeg", "/board.json": "json"}
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        kind = self.PATHS.get(url.path)
+        if kind is None:
+            self.send_error(404, f"Unknown path, use one of {', '.join(self.PATHS)}")
+            return
+
+        query = parse_qs(url.query)
+        try:
+            seed = int(query["seed"][0]) if "seed" in query else random.randrange(2**32)
+            width = int(query.get("width", ["6"])[0])
+            height = int(query.get("height", ["7"])[0])
+        except ValueError:
+            self.send_error(400, "seed, width and height must be numbers")
+            return
+        renderer_type = query.get("renderer", ["basic"])[0]
+        if not (1 <= width <= MAX_BOARD_SIZE and 1 <= height <= MAX_BOARD_SIZE):
+            self.send_error(400, f"width and height must be between 1 and {MAX_BOARD_SIZE}")
+            return
+        if width * height < MIN_BOARD_CELLS:
+            self.send_error(400, f"The board needs at least {MIN_BOARD_CELLS} cells")
+            return
+        if renderer_type not in RENDERERS:
+            self.send_error(400, f"renderer must be one of {', '.join(RENDERERS)}")
+            return
+
+        try:
+            #a random board is not asked again, it would only push seeded boards out of the cache
+            data = self.server.service.board(kind, seed, width, height, renderer_type, cache="seed" in query)
+        except Exception as e:
+            self.send_error(500, f"Could not make the board: {e}")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", self.CONTENT_TYPES[kind])
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-Board-Seed", str(seed))
+        if "seed" in query:
+            #same seed, same board: let the tablet cache it
+            self.send_header("Cache-Control", "public, max-age=86400")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def serve(host="127.0.0.1", port=8000, jobs=None, verbose=False, grid_settings=GRID_SETTINGS, renderer_settings=RENDERER_SETTINGS):
+    """Serve boards until interrupted."""
+    server = ThreadingHTTPServer((host, port), BoardRequestHandler)
+    server.daemon_threads = True
+    server.service = BoardService(jobs=jobs, grid_settings=grid_settings, renderer_settings=renderer_settings)
+    server.verbose = verbose
+    print(f"Serving boards on http://{host}:{port}/board.png?seed=1&width=6&height=7&renderer=sprites")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
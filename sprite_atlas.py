@@ -0,0 +1,51 @@
+from PIL import Image
+from lru import LRUCache
+
+
+class SpriteAtlas:
+    """All the sprites of a renderer, decoded once and kept in memory."""
+
+    # Sprites that also get pre-rotated copies (degrees, counter clockwise like PIL)
+    ROTATIONS = {"gate": (90, 270)}
+
+    def __init__(self, sprites: dict, scaled_cache_size=128):
+        self.images = {}
+        for name, path in sprites.items():
+            with Image.open(path) as image:
+                #background is pasted as is, everything else needs alpha for masking
+                self.images[(name, 0)] = image.convert("RGB" if name == "bg" else "RGBA")
+
+        for name, angles in self.ROTATIONS.items():
+            if (name, 0) in self.images:
+                for angle in angles:
+                    self.images[(name, angle)] = self.images[(name, 0)].rotate(angle, expand=False)
+
+        self.scaled = LRUCache(scaled_cache_size)
+
+
+    def get(self, name, scale=1, rotation=0):
+        """Sprite by name, optionally rotated and scaled up by an integer factor."""
+        sprite = self.images[(name, rotation)]
+        if scale <= 1:
+            return sprite
+
+        key = (name, rotation, scale)
+        scaled = self.scaled.get(key)
+        if scaled is None:
+            #nearest neighbour keeps the pixel art crisp
+            scaled = sprite.resize((sprite.size[0] * scale, sprite.size[1] * scale), Image.NEAREST)
+            self.scaled.put(key, scaled)
+        return scaled
+
+
+# One atlas per sprite set and per process
+_atlases = LRUCache(max_size=4)
+
+def get_atlas(sprites: dict) -> SpriteAtlas:
+    """Shared atlas for this sprite set, loaded on first use."""
+    key = tuple(sorted(sprites.items()))
+    atlas = _atlases.get(key)
+    if atlas is None:
+        atlas = SpriteAtlas(sprites)
+        _atlases.put(key, atlas)
+    return atlas
@@ -0,0 +1,86 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class Stats:
+    """Time spent per phase and counters (regenerations, retries, sprites pasted, bytes written...).
+
+    Grids and renderers report to their stats attribute, NO_STATS unless one is given.
+    on_phase(name, seconds) is called at the end of every phase when given.
+    """
+
+    def __init__(self, on_phase=None):
+        self.timers = {}
+        self.calls = {}
+        self.counters = {}
+        self.on_phase = on_phase
+
+
+    def __bool__(self):
+        return True
+
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+            if self.on_phase is not None:
+                self.on_phase(name, seconds)
+
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+
+    def merge(self, other):
+        """Add the timers and counters of other (a Stats or its to_dict()) to these."""
+        if isinstance(other, Stats):
+            other = other.to_dict()
+        for name, timer in other["timers"].items():
+            self.timers[name] = self.timers.get(name, 0.0) + timer["seconds"]
+            self.calls[name] = self.calls.get(name, 0) + timer["calls"]
+        for name, value in other["counters"].items():
+            self.count(name, value)
+        return self
+
+
+    def to_dict(self):
+        return {
+            "timers": {name: {"seconds": seconds, "calls": self.calls[name]} for name, seconds in self.timers.items()},
+            "counters": dict(self.counters),
+        }
+
+
+    def report(self):
+        """Phases slowest first, then the counters."""
+        lines = []
+        total = sum(self.timers.values())
+        for name, seconds in sorted(self.timers.items(), key=lambda item: -item[1]):
+            share = seconds / total * 100 if total else 0
+            lines.append(f"{name:>20}: {seconds * 1000:10.2f}ms {share:5.1f}%  ({self.calls[name]} calls)")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name:>20}: {value}")
+        return "\n".join(lines)
+
+
+class NoStats:
+    """Stats that keep nothing, the default: instrumentation costs a method call."""
+
+    _nothing = nullcontext()
+
+    def __bool__(self):
+        return False
+
+    def phase(self, name):
+        return self._nothing
+
+    def count(self, name, value=1):
+        pass
+
+
+NO_STATS = NoStats()
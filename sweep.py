@@ -0,0 +1,287 @@
+# Monte Carlo sweep of the generation knobs, boards are generated but not rendered:
+#   python sweep.py --ranges WALLINESS=10:50:10,GEMINESS=5|10|20 [--samples 1000] [--size 6x7]
+#                   [--jobs 4] [--engine classic] [--compact] [--repair] [--playable]
+#                   [--seed 0] [--output sweep.csv]
+# A range is start:stop:step (stop included), values separated by | or a single value, every
+# combination of the ranges is a point. Board i of every point is generated from seed + i, so
+# the points are compared on the same random draws. Writes one row per point, CSV or JSON
+# (from the extension of --output).
+import csv
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from cli import get_option, get_int_option, get_list_option
+from boards import make_grid, GRID_SETTINGS
+from grid import TreasureType, check_engine
+from stats import Stats
+
+# Generation knobs that can be swept
+SWEEP_PARAMETERS = ["WALLINESS", "TRAPINESS", "GEMINESS", "TREASURINESS", "TREASURINESS_DOUBLE", "MONSTERINESS", "NEMESISINESS"]
+# Boards generated by one task of the pool
+SAMPLES_PER_TASK = 250
+# Tasks waiting in the pool per worker: results are added up as they come, never all kept
+TASKS_PER_WORKER = 2
+# Fill ratio histogram resolution (bins per 1.0), for the percentiles
+FILL_BINS = 100
+# Per board contents reported, see board_contents()
+CONTENTS = ["gems", "treasures", "monsters", "traps", "walls"]
+
+
+class Running:
+    """Count, mean, standard deviation, min and max of values added one by one, in constant memory.
+
+    Two of them can be merged, so each task keeps its own and the main process adds them up.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.squares += value * value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.squares += other.squares
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+    @property
+    def std(self):
+        if not self.count:
+            return 0.0
+        return math.sqrt(max(0.0, self.squares / self.count - self.mean ** 2))
+
+
+class PointResult:
+    """What the boards of one point (one combination of settings) gave, added up."""
+
+    def __init__(self):
+        self.boards = 0
+        self.seconds = 0.0
+        # regenerations, repaired_cells, unplayable... as counted by Grid.generate
+        self.stats = Stats()
+        self.fill_ratio = Running()
+        self.fill_histogram = [0] * (FILL_BINS + 1)
+        self.contents = {name: Running() for name in CONTENTS}
+
+
+    def add(self, grid, seconds):
+        self.boards += 1
+        self.seconds += seconds
+        counts = board_contents(grid)
+        fill_ratio = counts.pop("filled") / (grid.width * grid.height)
+        self.fill_ratio.add(fill_ratio)
+        self.fill_histogram[int(fill_ratio * FILL_BINS)] += 1
+        for name, value in counts.items():
+            self.contents[name].add(value)
+
+
+    def merge(self, other):
+        self.boards += other.boards
+        self.seconds += other.seconds
+        self.stats.merge(other.stats)
+        self.fill_ratio.merge(other.fill_ratio)
+        self.fill_histogram = [a + b for a, b in zip(self.fill_histogram, other.fill_histogram)]
+        for name, running in other.contents.items():
+            self.contents[name].merge(running)
+        return self
+
+
+    def fill_percentile(self, percent):
+        """Fill ratio below which percent % of the boards are, to 1 / FILL_BINS."""
+        threshold = self.boards * percent / 100
+        seen = 0
+        for index, boards in enumerate(self.fill_histogram):
+            seen += boards
+            if seen >= threshold:
+                return index / FILL_BINS
+        return 1.0
+
+
+    def to_row(self):
+        counters = self.stats.counters
+        regenerations = counters.get("regenerations", 0)
+        row = {
+            "boards": self.boards,
+            #share of the whole boards made that were kept (is_good, and playability when checked)
+            "acceptance_rate": self.boards / (self.boards + regenerations) if self.boards else 0.0,
+            "mean_regenerations": regenerations / self.boards if self.boards else 0.0,
+            "mean_repaired_cells": counters.get("repaired_cells", 0) / self.boards if self.boards else 0.0,
+            "unplayable": counters.get("unplayable", 0),
+            "ms_per_board": self.seconds / self.boards * 1000 if self.boards else 0.0,
+            "fill_ratio_mean": self.fill_ratio.mean,
+            "fill_ratio_std": self.fill_ratio.std,
+            "fill_ratio_min": self.fill_ratio.minimum,
+            "fill_ratio_p10": self.fill_percentile(10),
+            "fill_ratio_p50": self.fill_percentile(50),
+            "fill_ratio_p90": self.fill_percentile(90),
+            "fill_ratio_max": self.fill_ratio.maximum,
+        }
+        for name, running in self.contents.items():
+            row[f"{name}_mean"] = running.mean
+            row[f"{name}_std"] = running.std
+        return row
+
+
+def board_contents(grid):
+    """Counts of one generated board: filled cells, gems, other treasures, monsters, traps, walls."""
+    counts = dict.fromkeys(["filled"] + CONTENTS, 0)
+    for row in grid.cells:
+        for cell in row:
+            if not cell.is_empty():
+                counts["filled"] += 1
+            for treasure in cell.treasures:
+                counts["gems" if treasure.treasure_type == TreasureType.GEMS else "treasures"] += 1
+            counts["monsters"] += len(cell.monsters)
+            counts["traps"] += len(cell.traps)
+            counts["walls"] += sum(cell.walls.values())
+    return counts
+
+
+def parse_range(spec):
+    """Values of a range: "10:50:10" (stop included), "5|10|20" or "10"."""
+    if ":" in spec:
+        start, stop, step = (int(value) for value in spec.split(":"))
+        return list(range(start, stop + 1, step))
+    return [int(value) for value in spec.split("|")]
+
+
+def parse_ranges(specs):
+    """{name: values} from NAME=range items, the names are checked against SWEEP_PARAMETERS."""
+    ranges = {}
+    for spec in specs:
+        name, _, values = spec.partition("=")
+        name = name.strip().upper()
+        if name not in SWEEP_PARAMETERS:
+            raise ValueError(f"Cannot sweep {name}, choose from {', '.join(SWEEP_PARAMETERS)}")
+        ranges[name] = parse_range(values)
+    return ranges
+
+
+def _sample(settings, width, height, compact, start, stop, base_seed):
+    """Generate boards start to stop of a point and add them up."""
+    result = PointResult()
+    for index in range(start, stop):
+        grid = make_grid(width, height, settings, seed=base_seed + index, compact=compact)
+        grid.stats = result.stats
+        begin = time.perf_counter()
+        grid.generate()
+        result.add(grid, time.perf_counter() - begin)
+    return result
+
+
+def sweep(ranges, samples=1000, width=6, height=7, grid_settings=GRID_SETTINGS, compact=False, seed=0, jobs=None, on_point=None):
+    """Generate samples boards for every combination of ranges ({name: values}) over jobs processes.
+
+    Returns one row (dict) per point, the swept values first. on_point(row) is called as soon as
+    all the boards of a point are in. At most TASKS_PER_WORKER tasks per worker are waiting, so
+    memory does not grow with samples.
+    """
+    names = list(ranges)
+    points = [dict(zip(names, values)) for values in itertools.product(*ranges.values())]
+    results = [PointResult() for _ in points]
+    tasks_left = [0] * len(points)
+    tasks = []
+    for number, point in enumerate(points):
+        for start in range(0, samples, SAMPLES_PER_TASK):
+            tasks.append((number, start, min(samples, start + SAMPLES_PER_TASK)))
+            tasks_left[number] += 1
+
+    rows = [None] * len(points)
+    jobs = jobs or os.cpu_count()
+    in_flight = jobs * TASKS_PER_WORKER
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = {}
+        tasks = iter(tasks)
+        while True:
+            for number, start, stop in itertools.islice(tasks, in_flight - len(pending)):
+                future = pool.submit(_sample, {**grid_settings, **points[number]}, width, height, compact, start, stop, seed)
+                pending[future] = number
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                number = pending.pop(future)
+                results[number].merge(future.result())
+                tasks_left[number] -= 1
+                if tasks_left[number] == 0:
+                    rows[number] = {**points[number], **results[number].to_row()}
+                    #the point is done, only its row is kept
+                    results[number] = None
+                    if on_point is not None:
+                        on_point(rows[number])
+    return rows
+
+
+def save(rows, output):
+    """Rows as CSV, or as JSON when output ends with .json."""
+    if output.endswith(".json"):
+        with open(output, "w") as f:
+            json.dump(rows, f, indent=2)
+        return
+    with open(output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def print_point(row):
+    values = " ".join(f"{name}={row[name]}" for name in SWEEP_PARAMETERS if name in row)
+    print(f"{values}: {row['acceptance_rate'] * 100:5.1f}% kept, {row['mean_regenerations']:.2f} regenerations, "
+          f"fill {row['fill_ratio_mean']:.2f} +/- {row['fill_ratio_std']:.2f}, {row['ms_per_board']:.2f}ms per board")
+
+
+def main():
+    width, height = (int(value) for value in get_option("--size", "6x7").lower().split("x"))
+    try:
+        ranges = parse_ranges(get_list_option("--ranges", "WALLINESS=25"))
+        engine = check_engine(get_option("--engine", "classic"))
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    samples = get_int_option("--samples", 1000)
+    seed = get_int_option("--seed")
+    seed = seed if seed is not None else random.randrange(2**32)
+    output = get_option("--output", "sweep.csv")
+    grid_settings = {**GRID_SETTINGS, "engine": engine,
+                     "REPAIR": "--repair" in sys.argv, "CHECK_PLAYABLE": "--playable" in sys.argv}
+
+    points = math.prod(len(values) for values in ranges.values())
+    print(f"Sweeping {points} points, {samples} boards of {width}x{height} each (seeds {seed} to {seed + samples - 1})")
+    begin = time.perf_counter()
+    try:
+        rows = sweep(ranges, samples, width, height, grid_settings, compact="--compact" in sys.argv,
+                     seed=seed, jobs=get_int_option("--jobs"), on_point=print_point)
+    except ValueError as e:
+        print(f"Error: {e}")
+        exit(1)
+    save(rows, output)
+    print(f"{points * samples} boards in {time.perf_counter() - begin:.1f}s, results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# The modules sit at the root of the repository and load their assets from relative paths
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from grid import Grid
+
+
+@pytest.fixture(autouse=True)
+def in_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def make_board():
+    """Generated boards: make_board(seed, width, height, grid_class, **settings) with settings like CHECK_PLAYABLE or engine."""
+    def make(seed=1234, width=7, height=8, grid_class=Grid, **settings):
+        grid = grid_class(width, height, seed=seed)
+        for name, value in settings.items():
+            setattr(grid, name, value)
+        grid.generate()
+        return grid
+    return make
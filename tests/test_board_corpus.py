@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+
+import board_corpus
+from board_corpus import BoardCorpus, generate_corpus, parse_query
+from board_hash import fingerprint, FingerprintSet
+from boards import GRID_SETTINGS
+
+
+@pytest.fixture
+def corpus_file(tmp_path):
+    path = str(tmp_path / "boards.bin")
+    generate_corpus(path, 200, seed=-3, jobs=1)
+    return path
+
+
+def test_negative_seeds(corpus_file):
+    corpus = BoardCorpus(corpus_file)
+    assert len(corpus) == 200
+    assert [corpus[number].seed for number in range(4)] == [-3, -2, -1, 0]
+
+
+def test_query_expression(corpus_file):
+    corpus = BoardCorpus(corpus_file)
+    index = corpus.index
+    expected = np.flatnonzero((index["gems"] >= 3) & (index["gems"] <= 5) & ~index["adjacent_bosses"] & (index["nemesis"][:, 0] > 1))
+    assert corpus.query_expression("3 <= gems <= 5 and not adjacent_bosses and nemesis[0] > 1").tolist() == expected.tolist()
+    assert len(corpus.query_expression("True")) == len(corpus)
+
+
+@pytest.mark.parametrize("expression", [
+    "().__class__.__base__.__subclasses__()",
+    "__import__('os').system('true')",
+    "np.ones(1)",
+    "gems.sum() > 0",
+    "nemesis[9] > 0",
+    "gems >",
+])
+def test_query_rejects_anything_else(expression):
+    with pytest.raises(ValueError):
+        parse_query(expression)
+
+
+def test_dedup_fills_in_missing_fingerprints(corpus_file):
+    #corpora written before the fingerprints have no .fp file
+    os.remove(corpus_file + ".fp")
+    writer = generate_corpus(corpus_file, 200, seed=-3, jobs=1, dedup=FingerprintSet())
+    assert writer.duplicates == 200
+    corpus = BoardCorpus(corpus_file)
+    with open(corpus_file + ".fp", "rb") as f:
+        fingerprints = f.read()
+    assert fingerprints == b"".join(fingerprint(corpus[number]) for number in range(len(corpus)))
+
+
+def test_blocks_keep_seed_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(board_corpus, "BLOCK_SIZE", 16)
+    path = str(tmp_path / "blocks.bin")
+    generate_corpus(path, 100, seed=5, jobs=2)
+    corpus = BoardCorpus(path)
+    assert [corpus[number].seed for number in range(len(corpus))] == list(range(5, 105))
+
+
+def test_other_settings_rejected(corpus_file):
+    with pytest.raises(ValueError):
+        generate_corpus(corpus_file, 10, grid_settings={**GRID_SETTINGS, "GEMINESS": 30}, jobs=1)
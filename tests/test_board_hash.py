@@ -0,0 +1,36 @@
+import copy
+
+import pytest
+
+from board_hash import fingerprint
+from grid import Grid
+from grid_compact import CompactGrid
+
+# Wall of a cell on the other side once the board is mirrored
+MIRRORED_WALLS = {'N': 'N', 'S': 'S', 'E': 'W', 'W': 'E'}
+
+
+def mirror(grid):
+    """Copy of the board with left and right swapped."""
+    mirrored = Grid(grid.width, grid.height, seed=grid.seed)
+    mirrored.cells = []
+    for row in grid.cells:
+        cells = []
+        for cell in reversed(row):
+            cell = copy.deepcopy(cell)
+            cell.walls = {MIRRORED_WALLS[direction]: wall for direction, wall in cell.walls.items()}
+            cells.append(cell)
+        mirrored.cells.append(cells)
+    return mirrored
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_mirror_and_compact_have_the_same_fingerprint(make_board, seed):
+    grid = make_board(seed)
+    assert fingerprint(mirror(grid)) == fingerprint(grid)
+    assert fingerprint(CompactGrid.from_grid(grid)) == fingerprint(grid)
+    assert fingerprint(CompactGrid.from_grid(mirror(grid))) == fingerprint(grid)
+
+
+def test_other_boards_have_other_fingerprints(make_board):
+    assert len({fingerprint(make_board(seed)) for seed in range(50)}) == 50
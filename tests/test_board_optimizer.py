@@ -0,0 +1,30 @@
+import pytest
+
+from board_optimizer import BoardOptimizer, BoardTally, parse_targets
+from grid import Grid
+from grid_compact import CompactGrid
+
+TARGETS = ["walls=25:", "gems=6", "nemesis_types=2:"]
+
+
+@pytest.mark.parametrize("grid_class", [Grid, CompactGrid])
+def test_tally_matches_the_board(make_board, grid_class):
+    for seed in range(20):
+        grid = make_board(seed, 6, 7, grid_class)
+        optimizer = BoardOptimizer(grid, parse_targets(TARGETS))
+        assert optimizer.optimize()
+        assert BoardTally(grid).metrics() == optimizer.tally.metrics()
+
+
+def test_playable_boards_stay_playable(make_board):
+    for seed in range(40):
+        grid = make_board(seed, 6, 7, CHECK_PLAYABLE=True)
+        optimizer = BoardOptimizer(grid, parse_targets(TARGETS))
+        assert optimizer.optimize()
+        assert grid.is_playable(), seed
+
+
+@pytest.mark.parametrize("spec", ["gems", "gems=", "gems=:", "diamonds=3"])
+def test_bad_targets(spec):
+    with pytest.raises(ValueError):
+        parse_targets([spec])
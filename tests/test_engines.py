@@ -0,0 +1,38 @@
+from collections import Counter
+
+import pytest
+
+from grid import Grid
+
+# Boards generated per engine
+BOARDS = 400
+
+
+def content_means(engine):
+    """Mean per board of the filled cells, walls, and of each trap, treasure and monster kind."""
+    totals = Counter()
+    for seed in range(BOARDS):
+        grid = Grid(6, 7, seed=seed, engine=engine)
+        grid.generate(check_good=False)
+        for row in grid.cells:
+            for cell in row:
+                totals["filled"] += not cell.is_empty()
+                totals["walls"] += sum(cell.walls.values())
+                totals["traps"] += len(cell.traps)
+                totals.update(treasure.treasure_type.value for treasure in cell.treasures)
+                totals.update(monster.name for monster in cell.monsters)
+                totals.update(hero.value for monster in cell.monsters for hero, level in monster.nemesis_classes)
+    return {name: total / BOARDS for name, total in totals.items()}
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        Grid(engine="vectorised")
+
+
+def test_vectorized_matches_classic_distributions():
+    classic = content_means("classic")
+    vectorized = content_means("vectorized")
+    assert set(vectorized) == set(classic)
+    for name, mean in classic.items():
+        assert vectorized[name] == pytest.approx(mean, rel=0.08, abs=0.1), name
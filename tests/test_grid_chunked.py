@@ -0,0 +1,18 @@
+import pytest
+
+from grid import Grid
+from grid_compact import CompactGrid
+
+
+def cells(grid):
+    assert grid.chunk_pool is None
+    return [grid.get_cell(x, y).to_dict() for y in range(grid.height) for x in range(grid.width)]
+
+
+@pytest.mark.parametrize("engine", ["classic", "vectorized"])
+def test_same_board_whatever_the_processes(make_board, engine):
+    boards = [
+        cells(make_board(5, 50, 41, grid_class, engine=engine, CHUNK_SIZE=16, CHUNK_JOBS=jobs))
+        for grid_class in (CompactGrid, Grid) for jobs in (1, 3)
+    ]
+    assert all(board == boards[0] for board in boards[1:])
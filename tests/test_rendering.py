@@ -0,0 +1,134 @@
+import random
+
+import pytest
+from PIL import Image, ImageChops
+
+from grid import Grid, Monster, Treasure, TreasureType, HEROES
+from grid_compact import CompactGrid
+from render_cache import RenderCache
+from render_parallel import render_parallel
+from renderer_basic import BasicRenderer
+from renderer_sprites import SpritesRenderer
+
+RENDERERS = [BasicRenderer, SpritesRenderer]
+
+
+def make_renderer(renderer_class):
+    renderer = renderer_class()
+    renderer.IMAGE_CELL_SIZE = 60
+    return renderer
+
+
+def same_pixels(image, other):
+    return ImageChops.difference(image.convert("RGB"), other.convert("RGB")).getbbox() is None
+
+
+@pytest.mark.parametrize("renderer_class", RENDERERS)
+def test_render_region(make_board, renderer_class):
+    grid = make_board()
+    renderer = make_renderer(renderer_class)
+    full = renderer.render(grid)
+    rng = random.Random(1)
+    for _ in range(10):
+        left, right = sorted(rng.sample(range(full.size[0] + 1), 2))
+        top, bottom = sorted(rng.sample(range(full.size[1] + 1), 2))
+        box = (left, top, right, bottom)
+        assert same_pixels(renderer.render_region(grid, box), full.crop(box)), box
+
+
+@pytest.mark.parametrize("renderer_class", RENDERERS)
+@pytest.mark.parametrize("band_rows", [1, 3])
+def test_to_image_tiled(make_board, renderer_class, band_rows, tmp_path):
+    grid = make_board()
+    renderer = make_renderer(renderer_class)
+    filename = tmp_path / "tiled.png"
+    renderer.to_image_tiled(grid, str(filename), band_rows=band_rows)
+    with Image.open(filename) as tiled:
+        assert same_pixels(tiled, renderer.render(grid))
+
+
+def test_to_image_tiled_only_png(make_board, tmp_path):
+    with pytest.raises(ValueError):
+        make_renderer(BasicRenderer).to_image_tiled(make_board(), str(tmp_path / "tiled.jpg"))
+
+
+@pytest.mark.parametrize("extension, pillow_format", [("png", "PNG"), ("jpg", "JPEG"), ("webp", "WEBP"), ("bmp", "BMP")])
+def test_format_from_extension(make_board, extension, pillow_format, tmp_path):
+    grid = make_board()
+    renderer = make_renderer(BasicRenderer)
+    renderer.save(renderer.render(grid), str(tmp_path / f"saved.{extension}"))
+    RenderCache(str(tmp_path / "cache")).to_image(grid, renderer, str(tmp_path / f"cached.{extension}"))
+    for name in ("saved", "cached"):
+        with Image.open(tmp_path / f"{name}.{extension}") as image:
+            assert image.format == pillow_format, name
+
+
+@pytest.mark.parametrize("setting, value", [("GOOD_FILL_RATIO", 0.5), ("REPAIR", True), ("CHECK_PLAYABLE", True), ("GEMINESS", 40)])
+def test_cache_key_follows_generation_settings(setting, value, tmp_path):
+    cache = RenderCache(str(tmp_path))
+    renderer = make_renderer(BasicRenderer)
+    grid = Grid(6, 7, seed=1)
+    key = cache.key(grid, renderer)
+    setattr(grid, setting, value)
+    assert cache.key(grid, renderer) != key
+
+
+@pytest.mark.parametrize("renderer_class", RENDERERS)
+@pytest.mark.parametrize("band_rows", [None, 3])
+def test_render_parallel(make_board, renderer_class, band_rows):
+    grid = make_board()
+    renderer = make_renderer(renderer_class)
+    assert same_pixels(render_parallel(grid, renderer, jobs=2, band_rows=band_rows), renderer.render(grid))
+
+
+def test_render_parallel_resized_background(make_board):
+    grid = make_board()
+    renderer = make_renderer(SpritesRenderer)
+    renderer.BACKGROUND_MODE = "resize"
+    assert same_pixels(render_parallel(grid, renderer, jobs=2, band_rows=2), renderer.render(grid))
+
+
+def edit_cell(grid, rng):
+    """One random change to one cell, made through the cell like a board editor would."""
+    cell = grid.get_cell(rng.randrange(grid.width), rng.randrange(grid.height))
+    edit = rng.randrange(5)
+    if edit == 0:
+        cell.traps = [] if cell.traps else ["Trap"]
+    elif edit == 1:
+        cell.treasures = [Treasure(rng.choice(list(TreasureType))) for _ in range(rng.randint(0, 2))]
+    elif edit == 2:
+        cell.monsters = [Monster("Troll", [(rng.choice(HEROES), rng.randint(1, 6))])]
+    elif edit == 3:
+        cell.boss_id = 0 if cell.boss_id else rng.randint(1, 3)
+    else:
+        direction = rng.choice("NSEW")
+        if cell.walls[direction]:
+            cell.remove_wall(direction)
+        else:
+            cell.add_wall(direction)
+
+
+@pytest.mark.parametrize("renderer_class", RENDERERS)
+@pytest.mark.parametrize("grid_class", [Grid, CompactGrid])
+def test_render_incremental(make_board, renderer_class, grid_class):
+    grid = make_board(grid_class=grid_class)
+    renderer = make_renderer(renderer_class)
+    renderer.render_incremental(grid)
+    rng = random.Random(2)
+    for _ in range(8):
+        for _ in range(rng.randint(1, 3)):
+            edit_cell(grid, rng)
+        assert same_pixels(renderer.render_incremental(grid), renderer.render(grid))
+
+
+@pytest.mark.parametrize("grid_class", [Grid, CompactGrid])
+def test_render_incremental_shared_grid(make_board, grid_class):
+    grid = make_board(grid_class=grid_class)
+    renderers = [make_renderer(renderer_class) for renderer_class in RENDERERS]
+    for renderer in renderers:
+        renderer.render_incremental(grid)
+    rng = random.Random(3)
+    for _ in range(6):
+        edit_cell(grid, rng)
+        for renderer in renderers:
+            assert same_pixels(renderer.render_incremental(grid), renderer.render(grid))
@@ -0,0 +1,30 @@
+import http.client
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from server import BoardRequestHandler, BoardService
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), BoardRequestHandler)
+    server.daemon_threads = True
+    server.service = BoardService(jobs=1)
+    server.verbose = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    server.service.shutdown()
+
+
+@pytest.mark.parametrize("size", ["width=1&height=2", "width=2&height=1", "width=1&height=1", "width=0&height=7"])
+def test_rejects_too_small_boards(server, size):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    connection.request("GET", f"/board.png?seed=1&{size}")
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    assert response.status == 400
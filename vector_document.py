@@ -0,0 +1,288 @@
+import base64
+import io
+import zlib
+from xml.sax.saxutils import escape, quoteattr
+
+from PIL import Image, ImageColor
+
+# PIL's default font is about this tall, text is drawn from its top left corner like PIL does
+FONT_SIZE = 11
+FONT_ASCENT = 9
+# Control points of a quarter circle made of one cubic Bezier curve
+BEZIER_CIRCLE = 0.5523
+
+
+def _box(xy):
+    """[x0, y0, x1, y1] from [(x0, y0), (x1, y1)] or [x0, y0, x1, y1], like ImageDraw takes."""
+    if isinstance(xy[0], (tuple, list)):
+        return [xy[0][0], xy[0][1], xy[1][0], xy[1][1]]
+    return list(xy)
+
+
+def _number(value):
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+class SVGDocument:
+    """One page of SVG, drawn with the ImageDraw / Image.paste calls of the renderers.
+
+    Every sprite is embedded once in <defs> and placed with <use>.
+    """
+
+    MULTI_PAGE = False
+
+    def __init__(self, file, width, height):
+        self.file = file
+        self.width = width
+        self.height = height
+        self.images = {}
+
+
+    def write(self, text):
+        self.file.write(text.encode("utf-8"))
+
+
+    def begin_page(self):
+        self.write(f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+                   f'width="{_number(self.width)}" height="{_number(self.height)}" viewBox="0 0 {_number(self.width)} {_number(self.height)}">\n')
+
+
+    def end_page(self):
+        self.write("</svg>\n")
+
+
+    def close(self):
+        pass
+
+
+    def color(self, fill):
+        return "#{:02x}{:02x}{:02x}".format(*ImageColor.getrgb(fill)[:3])
+
+
+    def begin_group(self, left, top, scale=1, clip=None):
+        """Following drawings moved to (left, top) and scaled, clipped to the (x0, y0, x1, y1) clip box."""
+        attributes = f'transform="translate({_number(left)} {_number(top)}) scale({_number(scale)})"'
+        self.write(f"<g {attributes}>\n")
+        if clip is not None:
+            #a nested viewport clips what is drawn outside of it
+            x0, y0, x1, y1 = clip
+            self.write(f'<svg x="{_number(x0)}" y="{_number(y0)}" width="{_number(x1 - x0)}" height="{_number(y1 - y0)}" '
+                       f'viewBox="{_number(x0)} {_number(y0)} {_number(x1 - x0)} {_number(y1 - y0)}" overflow="hidden">\n')
+
+
+    def end_group(self, clip=None):
+        self.write("</svg>\n</g>\n" if clip is not None else "</g>\n")
+
+
+    def line(self, xy, fill=None, width=1):
+        x0, y0, x1, y1 = _box(xy)
+        self.write(f'<line x1="{_number(x0)}" y1="{_number(y0)}" x2="{_number(x1)}" y2="{_number(y1)}" stroke="{self.color(fill)}" stroke-width="{_number(max(width, 1))}"/>\n')
+
+
+    def rectangle(self, xy, fill=None):
+        x0, y0, x1, y1 = _box(xy)
+        self.write(f'<rect x="{_number(x0)}" y="{_number(y0)}" width="{_number(x1 - x0)}" height="{_number(y1 - y0)}" fill="{self.color(fill)}"/>\n')
+
+
+    def ellipse(self, xy, fill=None):
+        x0, y0, x1, y1 = _box(xy)
+        self.write(f'<ellipse cx="{_number((x0 + x1) / 2)}" cy="{_number((y0 + y1) / 2)}" rx="{_number((x1 - x0) / 2)}" ry="{_number((y1 - y0) / 2)}" fill="{self.color(fill)}"/>\n')
+
+
+    def text(self, xy, text, fill=None):
+        self.write(f'<text x="{_number(xy[0])}" y="{_number(xy[1] + FONT_ASCENT)}" font-family="Helvetica, Arial, sans-serif" font-size="{FONT_SIZE}" fill="{self.color(fill)}">{escape(text)}</text>\n')
+
+
+    def paste(self, im, box, mask=None):
+        """Place a sprite at box (top left corner), defining it on first use."""
+        key = id(im)
+        if key not in self.images:
+            #keeping im alive keeps its id for this document
+            self.images[key] = (f"sprite{len(self.images) + 1}", im)
+            buffer = io.BytesIO()
+            im.save(buffer, "PNG")
+            self.write(f'<defs><image id="{self.images[key][0]}" width="{im.size[0]}" height="{im.size[1]}" style="image-rendering:pixelated" '
+                       f'xlink:href="data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode("ascii")}"/></defs>\n')
+        self.write(f'<use xlink:href="#{self.images[key][0]}" x="{_number(box[0])}" y="{_number(box[1])}"/>\n')
+
+
+    def image_file(self, path, box):
+        """Image file (the background) stretched to the (x0, y0, x1, y1) box, embedded once as is."""
+        x0, y0, x1, y1 = box
+        key = (path, x1 - x0, y1 - y0)
+        if key not in self.images:
+            self.images[key] = (f"image{len(self.images) + 1}", None)
+            with open(path, "rb") as f:
+                data = f.read()
+            with Image.open(io.BytesIO(data)) as image:
+                mime = Image.MIME.get(image.format, "image/png")
+            href = quoteattr(f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}")
+            self.write(f'<defs><image id="{self.images[key][0]}" width="{_number(x1 - x0)}" height="{_number(y1 - y0)}" preserveAspectRatio="none" xlink:href={href}/></defs>\n')
+        self.write(f'<use xlink:href="#{self.images[key][0]}" x="{_number(x0)}" y="{_number(y0)}"/>\n')
+
+
+class PDFDocument:
+    """Pages of a PDF streamed to file, drawn with the ImageDraw / Image.paste calls of the renderers.
+
+    Every page is written as soon as it is done. Images are written once, on first use, and
+    shared by all the pages through one resources dictionary written at the end.
+    """
+
+    MULTI_PAGE = True
+
+    def __init__(self, file, width, height):
+        self.file = file
+        self.width = width
+        self.height = height
+        self.offsets = {}
+        self.objects = 0
+        self.catalog = self.reserve()
+        self.pages = self.reserve()
+        self.resources = self.reserve()
+        self.font = self.reserve()
+        self.page_objects = []
+        self.images = {}
+        self.xobjects = {}
+        self.content = None
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+
+    def reserve(self):
+        """Number of an object written later."""
+        self.objects += 1
+        return self.objects
+
+
+    def write_object(self, number, dictionary, stream=None):
+        self.offsets[number] = self.file.tell()
+        if stream is None:
+            self.file.write(f"{number} 0 obj\n{dictionary}\nendobj\n".encode("latin-1"))
+        else:
+            dictionary = dictionary[:-2] + f" /Length {len(stream)} >>"
+            self.file.write(f"{number} 0 obj\n{dictionary}\nstream\n".encode("latin-1") + stream + b"\nendstream\nendobj\n")
+
+
+    def begin_page(self):
+        #y goes down like in PIL
+        self.content = [f"1 0 0 -1 0 {_number(self.height)} cm"]
+
+
+    def end_page(self):
+        contents = self.reserve()
+        self.write_object(contents, "<< /Filter /FlateDecode >>", zlib.compress("\n".join(self.content).encode("latin-1")))
+        page = self.reserve()
+        self.write_object(page, f"<< /Type /Page /Parent {self.pages} 0 R /MediaBox [0 0 {_number(self.width)} {_number(self.height)}] "
+                                f"/Contents {contents} 0 R /Resources {self.resources} 0 R >>")
+        self.page_objects.append(page)
+        self.content = None
+
+
+    def close(self):
+        xobjects = " ".join(f"/{name} {number} 0 R" for name, number in self.xobjects.items())
+        self.write_object(self.resources, f"<< /Font << /F1 {self.font} 0 R >> /XObject << {xobjects} >> >>")
+        self.write_object(self.font, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        kids = " ".join(f"{page} 0 R" for page in self.page_objects)
+        self.write_object(self.pages, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.page_objects)} >>")
+        self.write_object(self.catalog, f"<< /Type /Catalog /Pages {self.pages} 0 R >>")
+
+        xref = self.file.tell()
+        lines = [f"xref\n0 {self.objects + 1}\n", "0000000000 65535 f \n"]
+        lines += [f"{self.offsets[number]:010d} 00000 n \n" for number in range(1, self.objects + 1)]
+        lines.append(f"trailer\n<< /Size {self.objects + 1} /Root {self.catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n")
+        self.file.write("".join(lines).encode("latin-1"))
+
+
+    def color(self, fill):
+        return " ".join(_number(channel / 255) for channel in ImageColor.getrgb(fill)[:3])
+
+
+    def begin_group(self, left, top, scale=1, clip=None):
+        """Following drawings moved to (left, top) and scaled, clipped to the (x0, y0, x1, y1) clip box."""
+        self.content.append(f"q {_number(scale)} 0 0 {_number(scale)} {_number(left)} {_number(top)} cm")
+        if clip is not None:
+            x0, y0, x1, y1 = clip
+            self.content.append(f"{_number(x0)} {_number(y0)} {_number(x1 - x0)} {_number(y1 - y0)} re W n")
+
+
+    def end_group(self, clip=None):
+        self.content.append("Q")
+
+
+    def line(self, xy, fill=None, width=1):
+        x0, y0, x1, y1 = _box(xy)
+        self.content.append(f"{self.color(fill)} RG {_number(max(width, 1))} w {_number(x0)} {_number(y0)} m {_number(x1)} {_number(y1)} l S")
+
+
+    def rectangle(self, xy, fill=None):
+        x0, y0, x1, y1 = _box(xy)
+        self.content.append(f"{self.color(fill)} rg {_number(x0)} {_number(y0)} {_number(x1 - x0)} {_number(y1 - y0)} re f")
+
+
+    def ellipse(self, xy, fill=None):
+        x0, y0, x1, y1 = _box(xy)
+        cx, cy, rx, ry = (x0 + x1) / 2, (y0 + y1) / 2, (x1 - x0) / 2, (y1 - y0) / 2
+        kx, ky = rx * BEZIER_CIRCLE, ry * BEZIER_CIRCLE
+        points = [
+            (cx + rx, cy + ky, cx + kx, cy + ry, cx, cy + ry),
+            (cx - kx, cy + ry, cx - rx, cy + ky, cx - rx, cy),
+            (cx - rx, cy - ky, cx - kx, cy - ry, cx, cy - ry),
+            (cx + kx, cy - ry, cx + rx, cy - ky, cx + rx, cy),
+        ]
+        curves = " ".join(" ".join(_number(value) for value in curve) + " c" for curve in points)
+        self.content.append(f"{self.color(fill)} rg {_number(cx + rx)} {_number(cy)} m {curves} f")
+
+
+    def text(self, xy, text, fill=None):
+        text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        #flip the text back up
+        self.content.append(f"BT /F1 {FONT_SIZE} Tf {self.color(fill)} rg 1 0 0 -1 {_number(xy[0])} {_number(xy[1] + FONT_ASCENT)} Tm ({text}) Tj ET")
+
+
+    def place_image(self, name, box):
+        x0, y0, x1, y1 = box
+        #image space has its first row at the top of the unit square
+        self.content.append(f"q {_number(x1 - x0)} 0 0 {_number(y0 - y1)} {_number(x0)} {_number(y1)} cm /{name} Do Q")
+
+
+    def add_image(self, im):
+        """Write im as an image object (with its alpha as soft mask), return its resource name."""
+        name = f"Im{len(self.xobjects) + 1}"
+        smask = ""
+        if im.mode in ("RGBA", "LA"):
+            mask = self.reserve()
+            self.write_object(mask, f"<< /Type /XObject /Subtype /Image /Width {im.size[0]} /Height {im.size[1]} /ColorSpace /DeviceGray "
+                                    f"/BitsPerComponent 8 /Filter /FlateDecode >>", zlib.compress(im.getchannel("A").tobytes()))
+            smask = f" /SMask {mask} 0 R"
+        number = self.reserve()
+        self.write_object(number, f"<< /Type /XObject /Subtype /Image /Width {im.size[0]} /Height {im.size[1]} /ColorSpace /DeviceRGB "
+                                  f"/BitsPerComponent 8 /Filter /FlateDecode{smask} >>", zlib.compress(im.convert("RGB").tobytes()))
+        self.xobjects[name] = number
+        return name
+
+
+    def paste(self, im, box, mask=None):
+        """Place a sprite at box (top left corner), writing it on first use."""
+        key = id(im)
+        if key not in self.images:
+            #keeping im alive keeps its id for this document
+            self.images[key] = (self.add_image(im), im)
+        self.place_image(self.images[key][0], (box[0], box[1], box[0] + im.size[0], box[1] + im.size[1]))
+
+
+    def image_file(self, path, box):
+        """Image file (the background) stretched to the (x0, y0, x1, y1) box, a JPEG is embedded as is."""
+        if path not in self.images:
+            with Image.open(path) as image:
+                if image.format == "JPEG" and image.mode in ("RGB", "L"):
+                    name = f"Im{len(self.xobjects) + 1}"
+                    number = self.reserve()
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    color_space = "/DeviceRGB" if image.mode == "RGB" else "/DeviceGray"
+                    self.write_object(number, f"<< /Type /XObject /Subtype /Image /Width {image.size[0]} /Height {image.size[1]} "
+                                              f"/ColorSpace {color_space} /BitsPerComponent 8 /Filter /DCTDecode >>", data)
+                    self.xobjects[name] = number
+                else:
+                    name = self.add_image(image.convert("RGBA" if "A" in image.getbands() else "RGB"))
+            self.images[path] = (name, None)
+        self.place_image(self.images[path][0], box)